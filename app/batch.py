@@ -0,0 +1,136 @@
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models import Site, Section, Page, Ref
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+# Largest number of items accepted in one batch
+MAX_BATCH_ITEMS = 1000
+
+# Entities the batch endpoints work on, with the columns a batch update may change
+BATCH_MODELS = {
+    "pages": (Page, {"name", "title", "primary_image", "abstract", "content"}),
+    "sections": (Section, {"name", "title", "label"}),
+    "refs": (Ref, {"url", "description", "type"}),
+}
+
+
+def _model(entity: str):
+    if entity not in BATCH_MODELS:
+        raise HTTPException(status_code=404, detail=f"Unknown batch entity: {entity}")
+    return BATCH_MODELS[entity]
+
+
+# Lock the rows of a batch and return the set of ids that exist
+async def _lock_rows(db: AsyncSession, model, ids: list):
+    result = await db.execute(select(model.id).where(model.id.in_(ids)).order_by(model.id).with_for_update())
+    return set(result.scalars().all())
+
+
+# Run the statements of a batch and commit; a constraint violation rolls the whole batch back
+@asynccontextmanager
+async def _transaction(db: AsyncSession, entity: str, action: str):
+    try:
+        yield
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        logger.warning("Batch %s of %s rolled back: %s", action, entity, e.orig)
+        raise HTTPException(status_code=409, detail=f"Batch {action} rolled back: {e.orig}")
+
+
+def _results(ids: list, done: set, status: str):
+    results = [{"id": item_id, "status": status if item_id in done else "not_found"} for item_id in ids]
+    return {"applied": len(done), "not_found": len(ids) - len(done), "results": results}
+
+
+def _check_ids(ids: list):
+    if len(ids) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=422, detail="Each id may appear only once per batch")
+
+
+# Apply partial updates ({"id": .., <column>: ..}) in one transaction. Items are grouped by the
+# columns they set and each group is one executemany UPDATE keyed on the primary key.
+async def batch_update(db: AsyncSession, entity: str, items: list):
+    model, columns = _model(entity)
+    ids = [item["id"] for item in items]
+    _check_ids(ids)
+    for item in items:
+        unknown = set(item) - columns - {"id"}
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Cannot update {', '.join(sorted(unknown))} of {entity}")
+
+    existing = await _lock_rows(db, model, ids)
+    groups = {}
+    for item in items:
+        if item["id"] in existing and len(item) > 1:
+            groups.setdefault(tuple(sorted(item)), []).append(item)
+    async with _transaction(db, entity, "update"):
+        for rows in groups.values():
+            await db.execute(update(model), rows)
+
+    logger.info("Batch update of %s: %s of %s items applied", entity, len(existing), len(items))
+    return _results(ids, existing, "updated")
+
+
+# Set sort_order for many rows in one transaction (one executemany UPDATE)
+async def batch_reorder(db: AsyncSession, entity: str, items: list):
+    model, _ = _model(entity)
+    ids = [item["id"] for item in items]
+    _check_ids(ids)
+
+    existing = await _lock_rows(db, model, ids)
+    rows = [{"id": item["id"], "sort_order": item["sort_order"]} for item in items if item["id"] in existing]
+    async with _transaction(db, entity, "reorder"):
+        if rows:
+            await db.execute(update(model), rows)
+    logger.info("Batch reorder of %s: %s of %s items applied", entity, len(rows), len(items))
+    return _results(ids, existing, "reordered")
+
+
+# Delete many rows with one DELETE ... RETURNING (children go with them through ON DELETE CASCADE)
+async def batch_delete(db: AsyncSession, entity: str, ids: list):
+    model, _ = _model(entity)
+    _check_ids(ids)
+
+    await _lock_rows(db, model, ids)
+    async with _transaction(db, entity, "delete"):
+        result = await db.execute(delete(model).where(model.id.in_(ids)).returning(model.id))
+        deleted = set(result.scalars().all())
+
+    logger.info("Batch delete of %s: %s of %s items deleted", entity, len(deleted), len(ids))
+    return _results(ids, deleted, "deleted")
+
+
+# Move many pages into another section with one UPDATE ... RETURNING. The target section is
+# share-locked, so it cannot be renamed or deleted before the move commits.
+async def batch_move_pages(db: AsyncSession, page_ids: list, site_name: str, section_name: str):
+    _check_ids(page_ids)
+    result = await db.execute(
+        select(Section.id, Section.site_id).join(Site)
+        .where(Site.name == site_name, Section.name == section_name)
+        .with_for_update(read=True, of=Section)
+    )
+    section = result.one_or_none()
+    if not section:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Section not found")
+    section_id, site_id = section
+
+    await _lock_rows(db, Page, page_ids)
+    async with _transaction(db, "pages", "move"):
+        result = await db.execute(
+            update(Page).where(Page.id.in_(page_ids)).values(section_id=section_id, site_id=site_id).returning(Page.id)
+        )
+        moved = set(result.scalars().all())
+
+    logger.info("Batch move of pages to %s/%s: %s of %s items moved", site_name, section_name, len(moved), len(page_ids))
+    return _results(page_ids, moved, "moved")
@@ -0,0 +1,263 @@
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.publishing import PUBLISH_TABLES, site_scope, generation_lock_statement, log_statement
+import json
+import re
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+# Blue/green publishing: the next generation of the published schema is built in a staging
+# schema and swapped in by renaming schemas; the generation it replaces is kept for rollback.
+PUBLISHED_SCHEMA = "published"
+STAGING_SCHEMA = "published_staging"
+PREVIOUS_SCHEMA = "published_previous"
+
+PUBLISH_COLUMNS = dict(PUBLISH_TABLES)
+
+
+# Tables of the published schema; partitions are left out (each comes with its parent)
+async def _published_tables(db: AsyncSession):
+    result = await db.execute(text("""
+        SELECT relname FROM pg_class
+        WHERE relnamespace = CAST(:schema AS regnamespace) AND relkind IN ('r', 'p') AND NOT relispartition
+        ORDER BY relname
+    """), {"schema": PUBLISHED_SCHEMA})
+    return result.scalars().all()
+
+
+# Columns that can be copied (generated columns such as search_vector are recomputed)
+async def _copy_columns(db: AsyncSession, table: str):
+    result = await db.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = :schema AND table_name = :table AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """), {"schema": PUBLISHED_SCHEMA, "table": table})
+    return result.scalars().all()
+
+
+# Create an empty copy of a published table in the staging schema: columns, defaults,
+# indexes, checks, storage/compression and reloptions, and for a partitioned table (see
+# scripts/database/partition_by_site.sql) its partitions. Serial defaults are dropped (ids
+# always come from draft, and the sequences stay with the table they belong to).
+async def _create_staging_table(db: AsyncSession, table: str):
+    partitioned = await db.execute(
+        text("SELECT pg_get_partkeydef(CAST(:table AS regclass))"), {"table": f"{PUBLISHED_SCHEMA}.{table}"}
+    )
+    partition_key = partitioned.scalar()
+    partition_by = f" PARTITION BY {partition_key}" if partition_key else ""
+    await db.execute(text(
+        f"CREATE TABLE {STAGING_SCHEMA}.{table} (LIKE {PUBLISHED_SCHEMA}.{table} INCLUDING ALL){partition_by}"
+    ))
+    serials = await db.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = :schema AND table_name = :table AND column_default LIKE :serial
+    """), {"schema": STAGING_SCHEMA, "table": table, "serial": "nextval(%"})
+    for column in serials.scalars().all():
+        await db.execute(text(f"ALTER TABLE {STAGING_SCHEMA}.{table} ALTER COLUMN {column} DROP DEFAULT"))
+    options = await db.execute(
+        text("SELECT array_to_string(reloptions, ', ') FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+        {"table": f"{PUBLISHED_SCHEMA}.{table}"},
+    )
+    reloptions = options.scalar()
+    if reloptions:
+        await db.execute(text(f"ALTER TABLE {STAGING_SCHEMA}.{table} SET ({reloptions})"))
+    if partition_key:
+        await _create_staging_partitions(db, table)
+
+
+# Create the partitions of a staged partitioned table with the bounds and reloptions of the
+# published ones (their indexes come from the parent)
+async def _create_staging_partitions(db: AsyncSession, table: str):
+    partitions = await db.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), array_to_string(c.reloptions, ', ')
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass)
+    """), {"table": f"{PUBLISHED_SCHEMA}.{table}"})
+    for partition, bound, reloptions in partitions.all():
+        await db.execute(text(f"CREATE TABLE {STAGING_SCHEMA}.{partition} PARTITION OF {STAGING_SCHEMA}.{table} {bound}"))
+        if reloptions:
+            await db.execute(text(f"ALTER TABLE {STAGING_SCHEMA}.{partition} SET ({reloptions})"))
+
+
+# Fill a staging table: the site's rows from draft, then every other published row as it is.
+# Draft rows win on conflicts (e.g. a page that moved here from another site).
+async def _fill_staging_table(db: AsyncSession, table: str, params: dict):
+    columns = ", ".join(await _copy_columns(db, table))
+    if table not in PUBLISH_COLUMNS:
+        result = await db.execute(text(
+            f"INSERT INTO {STAGING_SCHEMA}.{table} ({columns}) SELECT {columns} FROM {PUBLISHED_SCHEMA}.{table}"
+        ))
+        return {"copied": 0, "kept": result.rowcount}
+
+    published_columns = ", ".join(PUBLISH_COLUMNS[table])
+    copied = await db.execute(text(f"""
+        INSERT INTO {STAGING_SCHEMA}.{table} ({published_columns})
+        SELECT {published_columns} FROM draft.{table} WHERE {site_scope('draft', table)}
+    """), params)
+    kept = await db.execute(text(f"""
+        INSERT INTO {STAGING_SCHEMA}.{table} ({columns})
+        SELECT {columns} FROM {PUBLISHED_SCHEMA}.{table} WHERE NOT ({site_scope(PUBLISHED_SCHEMA, table)})
+        ON CONFLICT DO NOTHING
+    """), params)
+    return {"copied": copied.rowcount, "kept": kept.rowcount}
+
+
+# Recreate the published schema's foreign keys on the staging tables. NOT VALID: the rows were
+# just copied from consistent sources, and validating would rescan every table. Partitioned
+# tables do not take NOT VALID foreign keys, and their partitions get theirs from the parent.
+async def _copy_foreign_keys(db: AsyncSession):
+    result = await db.execute(text("""
+        SELECT c.relname, con.conname, pg_get_constraintdef(con.oid), c.relkind = 'p'
+        FROM pg_constraint con JOIN pg_class c ON c.oid = con.conrelid
+        WHERE con.contype = 'f' AND con.connamespace = CAST(:schema AS regnamespace) AND con.conparentid = 0
+    """), {"schema": PUBLISHED_SCHEMA})
+    for table, name, definition, partitioned in result.all():
+        not_valid = "" if partitioned else " NOT VALID"
+        await db.execute(text(f"ALTER TABLE {STAGING_SCHEMA}.{table} ADD CONSTRAINT {name} {_restage(definition)}{not_valid}"))
+
+
+# Recreate the published schema's materialized views (e.g. site_nav) over the staging tables,
+# with their indexes; they are built from the staged rows, so need no refresh
+async def _copy_materialized_views(db: AsyncSession):
+    views = await db.execute(
+        text("SELECT matviewname, definition FROM pg_matviews WHERE schemaname = :schema"),
+        {"schema": PUBLISHED_SCHEMA},
+    )
+    for view, definition in views.all():
+        definition = _restage(definition).rstrip().rstrip(";")
+        await db.execute(text(f"CREATE MATERIALIZED VIEW {STAGING_SCHEMA}.{view} AS {definition}"))
+        indexes = await db.execute(
+            text("SELECT indexdef FROM pg_indexes WHERE schemaname = :schema AND tablename = :view"),
+            {"schema": PUBLISHED_SCHEMA, "view": view},
+        )
+        for index in indexes.scalars().all():
+            await db.execute(text(_restage(index)))
+
+
+# Point a definition read from the catalog at the staging schema
+def _restage(sql: str) -> str:
+    return re.sub(rf"\b{PUBLISHED_SCHEMA}\.", f"{STAGING_SCHEMA}.", sql)
+
+
+# Give the staging schema, tables and views the grants of the published ones (e.g. a read-only role)
+async def _copy_grants(db: AsyncSession):
+    result = await db.execute(text("""
+        SELECT acl.privilege_type,
+               CASE WHEN acl.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(acl.grantee)) END
+        FROM pg_namespace n, aclexplode(n.nspacl) acl
+        WHERE n.nspname = :schema AND acl.grantee <> n.nspowner
+    """), {"schema": PUBLISHED_SCHEMA})
+    for privilege, grantee in result.all():
+        await db.execute(text(f"GRANT {privilege} ON SCHEMA {STAGING_SCHEMA} TO {grantee}"))
+    result = await db.execute(text("""
+        SELECT c.relname, acl.privilege_type,
+               CASE WHEN acl.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(acl.grantee)) END
+        FROM pg_class c, aclexplode(c.relacl) acl
+        WHERE c.relnamespace = CAST(:schema AS regnamespace) AND c.relkind IN ('r', 'm', 'p')
+          AND acl.grantee <> c.relowner
+    """), {"schema": PUBLISHED_SCHEMA})
+    for relation, privilege, grantee in result.all():
+        await db.execute(text(f"GRANT {privilege} ON {STAGING_SCHEMA}.{relation} TO {grantee}"))
+
+
+async def _rename_schema(db: AsyncSession, old: str, new: str):
+    await db.execute(text(f"ALTER SCHEMA {old} RENAME TO {new}"))
+
+
+async def _schema_exists(db: AsyncSession, schema: str):
+    result = await db.execute(
+        text("SELECT 1 FROM information_schema.schemata WHERE schema_name = :schema"), {"schema": schema}
+    )
+    return result.scalar() is not None
+
+
+async def publish_blue_green(db: AsyncSession, site_name: str, progress=None):
+    """
+    Publish a site by building the next published generation in STAGING_SCHEMA and swapping
+    it in. Live readers never wait on the build: it only reads the published tables, and
+    the swap at the end is two schema renames. The replaced generation is kept as
+    PREVIOUS_SCHEMA until the next blue/green publish (see rollback_blue_green).
+
+    Runs in the caller's transaction (the caller commits); returns per-table stats.
+    """
+    params = {"site_name": site_name}
+    site = await db.execute(text("SELECT id FROM draft.sites WHERE name = :site_name"), params)
+    params["site_id"] = site.scalar()
+    stats = {}
+
+    # Exclusive: a publish of another site committed during the build would be lost in the swap
+    await db.execute(generation_lock_statement())
+    # Keeps table names in definitions read from the catalog schema-qualified (see _restage)
+    await db.execute(text("SET LOCAL search_path TO pg_catalog"))
+
+    await db.execute(text(f"DROP SCHEMA IF EXISTS {STAGING_SCHEMA} CASCADE"))
+    await db.execute(text(f"CREATE SCHEMA {STAGING_SCHEMA}"))
+    tables = await _published_tables(db)
+    for table in tables:
+        await _create_staging_table(db, table)
+
+    # Parents first, then any other published tables (e.g. templates)
+    ordered = [table for table in PUBLISH_COLUMNS if table in tables]
+    ordered += [table for table in tables if table not in PUBLISH_COLUMNS]
+    for table in ordered:
+        stats[table] = await _fill_staging_table(db, table, params)
+        await db.execute(text(f"ANALYZE {STAGING_SCHEMA}.{table}"))  # plans are good from the first read
+        logger.info("Blue/green staging of %s for %s: %s", table, site_name, stats[table])
+        if progress:
+            await progress(table, stats[table])
+    await _copy_foreign_keys(db)
+    await _copy_materialized_views(db)
+    await _copy_grants(db)
+
+    # The swap: until commit, readers keep using the current generation
+    await db.execute(text(f"DROP SCHEMA IF EXISTS {PREVIOUS_SCHEMA} CASCADE"))
+    await _rename_schema(db, PUBLISHED_SCHEMA, PREVIOUS_SCHEMA)
+    await _rename_schema(db, STAGING_SCHEMA, PUBLISHED_SCHEMA)
+
+    details = json.dumps({"mode": "blue_green", "tables": stats})
+    await db.execute(log_statement(), {**params, "action": "publish", "details": details})
+    return stats
+
+
+# The last publish or rollback in the log, with the name of its site
+async def _last_publish(db: AsyncSession):
+    result = await db.execute(text("""
+        SELECT log.action, log.details, sites.name
+        FROM workflow.publishing_log log JOIN draft.sites sites ON sites.id = log.site_id
+        WHERE log.action IN ('publish', 'rollback')
+        ORDER BY log.id DESC LIMIT 1
+    """))
+    return result.first()
+
+
+async def rollback_blue_green(db: AsyncSession, site_name: str):
+    """
+    Swap the previous published generation back in (and keep the rolled-back one as the
+    previous generation, so a second rollback undoes the first).
+
+    Only the most recent publish can be rolled back, and only if it was a blue/green publish
+    of this site: the previous generation predates every later publish of any site.
+    Runs in the caller's transaction.
+    """
+    await db.execute(generation_lock_statement())
+
+    if not await _schema_exists(db, PREVIOUS_SCHEMA):
+        raise HTTPException(status_code=409, detail="No previous published generation to roll back to")
+    last = await _last_publish(db)
+    blue_green = last is not None and (
+        last.action == "rollback" or json.loads(last.details or "{}").get("mode") == "blue_green"
+    )
+    if not blue_green or last.name != site_name:
+        raise HTTPException(status_code=409, detail="Only the latest publish can be rolled back, and only a blue/green one of this site")
+
+    await db.execute(text(f"DROP SCHEMA IF EXISTS {STAGING_SCHEMA} CASCADE"))
+    await _rename_schema(db, PUBLISHED_SCHEMA, STAGING_SCHEMA)
+    await _rename_schema(db, PREVIOUS_SCHEMA, PUBLISHED_SCHEMA)
+    await _rename_schema(db, STAGING_SCHEMA, PREVIOUS_SCHEMA)
+
+    await db.execute(log_statement(), {"site_name": site_name, "action": "rollback",
+                                       "details": json.dumps({"mode": "blue_green"})})
+    logger.info("Rolled back the published generation for %s", site_name)
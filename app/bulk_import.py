@@ -0,0 +1,234 @@
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models import Site, Section, Page, Ref, Note
+from app.schemas import PageCreate, RefCreate, NoteCreate
+import json
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+# Rows written per INSERT statement / commit
+BULK_BATCH_SIZE = 500
+
+# NDJSON record types and the schema each line is validated against
+RECORD_SCHEMAS = {
+    "page": PageCreate,
+    "ref": RefCreate,
+    "note": NoteCreate,
+}
+
+
+class BulkImporter:
+    """
+    Imports pages, refs and notes from NDJSON records in batches.
+
+    Each record is a JSON object with a "type" ("page", "ref" or "note") plus the fields
+    of the matching create schema. Site, section and page names are resolved from
+    in-memory maps that are filled with one query per site, and rows are written with
+    one multi-row INSERT per batch. Bad records are reported by line number and skipped.
+    """
+
+    def __init__(self, db: AsyncSession, batch_size: int = BULK_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.site_ids = {}     # site_name -> site_id (None if the site does not exist)
+        self.section_ids = {}  # (site_name, section_name) -> section_id
+        self.page_ids = {}     # (site_name, section_name, page_name) -> page_id
+        self.pending = {record_type: [] for record_type in RECORD_SCHEMAS}
+        self.inserted = {record_type: 0 for record_type in RECORD_SCHEMAS}
+        self.errors = []
+
+    # Load the section and page ids of a site (once per site)
+    async def _load_site(self, site_name: str):
+        if site_name in self.site_ids:
+            return
+        result = await self.db.execute(select(Site.id).where(Site.name == site_name))
+        self.site_ids[site_name] = result.scalar_one_or_none()
+        if self.site_ids[site_name] is None:
+            return
+
+        result = await self.db.execute(
+            select(Section.id, Section.name).join(Site).where(Site.name == site_name)
+        )
+        for section_id, section_name in result.all():
+            self.section_ids[(site_name, section_name)] = section_id
+
+        result = await self.db.execute(
+            select(Page.id, Page.name, Section.name).join(Section).join(Site).where(Site.name == site_name)
+        )
+        for page_id, page_name, section_name in result.all():
+            self.page_ids[(site_name, section_name, page_name)] = page_id
+
+    def _error(self, line_no: int, message: str):
+        self.errors.append({"line": line_no, "error": message})
+
+    # Validate one NDJSON line (text, or UTF-8 bytes) and queue it for the next batch
+    async def add_line(self, line_no: int, line):
+        if isinstance(line, (bytes, bytearray)):
+            try:
+                line = line.decode("utf-8")
+            except UnicodeDecodeError as e:
+                self._error(line_no, f"Line is not valid UTF-8: {e.reason} at byte {e.start}")
+                return
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+            record_type = record.pop("type")
+            schema = RECORD_SCHEMAS[record_type]
+        except (ValueError, AttributeError, KeyError):
+            self._error(line_no, "Expected a JSON object with a 'type' of page, ref or note")
+            return
+        try:
+            data = schema(**record)
+        except ValidationError as e:
+            self._error(line_no, str(e))
+            return
+
+        await self._load_site(data.site_name)
+        if self.site_ids[data.site_name] is None:
+            self._error(line_no, "Site not found")
+            return
+        if (data.site_name, data.section_name) not in self.section_ids:
+            self._error(line_no, "Section not found")
+            return
+
+        self.pending[record_type].append((line_no, data))
+        if len(self.pending[record_type]) >= self.batch_size:
+            await self.flush(record_type)
+
+    def _page_row(self, data: PageCreate):
+        return {
+            "section_id": self.section_ids[(data.site_name, data.section_name)],
+            "site_id": self.site_ids[data.site_name],
+            "name": data.name,
+            "title": data.title,
+            "primary_image": data.primary_image,
+            "abstract": data.abstract,
+            "content": data.content,
+        }
+
+    def _child_row(self, record_type: str, data):
+        page_id = self.page_ids.get((data.site_name, data.section_name, data.page_name))
+        if page_id is None:
+            return None
+        site_id = self.site_ids[data.site_name]
+        if record_type == "ref":
+            return {"page_id": page_id, "site_id": site_id, "url": data.url, "description": data.description}
+        return {"page_id": page_id, "site_id": site_id, "note": data.note}
+
+    # Write the queued records of one type with a single INSERT
+    async def flush(self, record_type: str):
+        batch = self.pending[record_type]
+        self.pending[record_type] = []
+        if not batch:
+            return
+
+        # Refs and notes may point at pages queued earlier in the same stream
+        if record_type != "page":
+            await self.flush("page")
+
+        lines, rows = [], []
+        for line_no, data in batch:
+            row = self._page_row(data) if record_type == "page" else self._child_row(record_type, data)
+            if row is None:
+                self._error(line_no, "Page not found")
+                continue
+            lines.append(line_no)
+            rows.append(row)
+        if not rows:
+            return
+
+        try:
+            await self._insert(record_type, rows)
+        except SQLAlchemyError as e:
+            # Retry row by row so only the offending records are reported
+            await self.db.rollback()
+            logger.warning("Bulk import batch of %s %ss failed, retrying rows one by one: %s", len(rows), record_type, e)
+            for line_no, row in zip(lines, rows):
+                try:
+                    await self._insert(record_type, [row])
+                except SQLAlchemyError as e:
+                    await self.db.rollback()
+                    self._error(line_no, f"Insert failed: {e.__class__.__name__}: {e.orig if hasattr(e, 'orig') else e}")
+
+    async def _insert(self, record_type: str, rows: list):
+        if record_type == "page":
+            result = await self.db.execute(insert(Page).returning(Page.id, Page.name, Page.section_id), rows)
+            inserted_pages = result.all()
+        else:
+            model = {"ref": Ref, "note": Note}[record_type]
+            await self.db.execute(insert(model), rows)
+        await self.db.commit()
+
+        if record_type == "page":
+            by_section = {section_id: key for key, section_id in self.section_ids.items()}
+            for page_id, page_name, section_id in inserted_pages:
+                site_name, section_name = by_section[section_id]
+                self.page_ids[(site_name, section_name, page_name)] = page_id
+        self.inserted[record_type] += len(rows)
+        logger.info("Bulk import wrote %s %ss", len(rows), record_type)
+
+    async def finish(self):
+        for record_type in RECORD_SCHEMAS:
+            await self.flush(record_type)
+        return {"inserted": self.inserted, "errors": sorted(self.errors, key=lambda error: error["line"])}
+
+
+# Split an async stream of byte chunks (e.g. a request body) into lines of bytes.
+# Lines are left undecoded so a bad byte is reported against its line number by BulkImporter.add_line
+async def iter_lines(chunks):
+    buffer = bytearray()
+    async for chunk in chunks:
+        # Only the new chunk is searched, so a long line costs linear time however it is split up
+        newline = chunk.rfind(b"\n")
+        if newline == -1:
+            buffer += chunk
+            continue
+        buffer += chunk[:newline]
+        for line in buffer.split(b"\n"):
+            yield bytes(line)
+        buffer = bytearray(chunk[newline + 1:])
+    if buffer:
+        yield bytes(buffer)
+
+# Import NDJSON lines from an (async) iterator of text or byte lines
+async def import_ndjson(db: AsyncSession, lines, batch_size: int = BULK_BATCH_SIZE):
+    importer = BulkImporter(db, batch_size)
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        await importer.add_line(line_no, line)
+    return await importer.finish()
+
+
+# Command line import: python -m app.bulk_import pages.ndjson [--batch-size N]
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import sys
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Bulk import pages, refs and notes from an NDJSON file")
+    parser.add_argument("file", help="NDJSON file to import, or - for stdin")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    args = parser.parse_args()
+
+    async def read_lines(stream):
+        for line in stream:
+            yield line
+
+    async def main():
+        stream = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+        with stream:
+            async with SessionLocal() as db:
+                return await import_ndjson(db, read_lines(stream), args.batch_size)
+
+    summary = asyncio.run(main())
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["errors"] else 0)
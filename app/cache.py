@@ -0,0 +1,79 @@
+from collections import OrderedDict
+import os
+import time
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+# Cache tuning (override through the environment / .env)
+PUBLISHED_CACHE_MAX_SIZE = int(os.getenv("PUBLISHED_CACHE_MAX_SIZE", "1024"))
+PUBLISHED_CACHE_TTL = float(os.getenv("PUBLISHED_CACHE_TTL", "300"))
+
+
+class TTLCache:
+    """
+    Small in-process LRU cache with per-entry expiry.
+
+    Keys are tuples; all entries sharing a first element (e.g. a site name) can be
+    dropped at once with invalidate_prefix. Each invalidation bumps that prefix's
+    generation: a reader takes generation() before its query and passes it to set(),
+    which then skips values read before an invalidation that happened meanwhile.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._last_generation = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def generation(self, first):
+        return self._generations.get(first, 0)
+
+    def set(self, key, value, generation: int = None):
+        if self.max_size <= 0:
+            return
+        if generation is not None and generation != self.generation(key[0]):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def invalidate_prefix(self, first):
+        self._last_generation += 1
+        self._generations[first] = self._last_generation
+        stale = [key for key in self._entries if key[0] == first]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def invalidate_site(self, site_name: str):
+        removed = self.invalidate_prefix(site_name)
+        logger.info("Cache invalidated %s entries for site: %s", removed, site_name)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Published page responses keyed by (site_name, page_name)
+published_page_cache = TTLCache(max_size=PUBLISHED_CACHE_MAX_SIZE, ttl=PUBLISHED_CACHE_TTL)
+
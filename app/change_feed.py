@@ -0,0 +1,221 @@
+from collections import deque
+from datetime import timedelta
+from sqlalchemy import delete, func
+from sqlalchemy.future import select
+from app.cache import published_page_cache
+from app.database import DATABASE_URL, DB_PGBOUNCER, SessionLocal, env_flag
+from app.models import ChangeEvent
+import asyncio
+import asyncpg
+import json
+import os
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+# Change feed settings (override through the environment / .env)
+CHANGE_FEED_ENABLED = env_flag("CHANGE_FEED_ENABLED", "true")
+CHANGE_FEED_BUFFER = int(os.getenv("CHANGE_FEED_BUFFER", "1000"))              # recent events kept for resuming clients
+CHANGE_FEED_REPLAY_LIMIT = int(os.getenv("CHANGE_FEED_REPLAY_LIMIT", "10000"))  # older resumes get a reset event
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "1000"))      # per client; slower clients are dropped
+CHANGE_FEED_KEEPALIVE = float(os.getenv("CHANGE_FEED_KEEPALIVE", "15"))          # seconds between keepalive comments
+CHANGE_FEED_RETENTION_DAYS = float(os.getenv("CHANGE_FEED_RETENTION_DAYS", "7"))
+# LISTEN needs a session of its own, which pgbouncer's transaction pooling does not keep: with
+# DB_PGBOUNCER the feed only runs when this points at PostgreSQL directly
+CHANGE_FEED_DATABASE_URL = os.getenv("CHANGE_FEED_DATABASE_URL", "" if DB_PGBOUNCER else DATABASE_URL)
+
+# Channel the schema.sql triggers notify on
+CHANGE_CHANNEL = "guten_changes"
+PRUNE_INTERVAL = 3600
+
+
+def event_dict(row: ChangeEvent):
+    return {
+        "id": row.id,
+        "entity": row.entity,
+        "entity_id": row.entity_id,
+        "site": row.site,
+        "action": row.action,
+        "version": row.version.isoformat() if row.version else None,
+        "row_count": row.row_count,
+    }
+
+
+def format_event(event: dict) -> str:
+    return f"id: {event['id']}\nevent: change\ndata: {json.dumps(event)}\n\n"
+
+
+class _Subscriber:
+    def __init__(self, site: str = None):
+        self.site = site
+        self.queue = asyncio.Queue(maxsize=CHANGE_FEED_QUEUE_SIZE)
+        self.closed = False
+
+
+class ChangeFeed:
+    """
+    Fans the change events of the guten_changes channel out to Server-Sent Events clients.
+
+    One LISTEN connection per process serves every client: each notification is appended
+    to a buffer of recent events and put on every matching client's queue. Clients that
+    resume with a Last-Event-ID are replayed from that buffer, or from
+    workflow.change_events when the id is older than the buffer. A client whose queue
+    fills up is disconnected; it reconnects and resumes like any other.
+    """
+
+    def __init__(self, dsn: str, session_factory):  # dsn: None when there is no direct connection
+        self.dsn = dsn
+        self.session_factory = session_factory
+        self.buffer = deque(maxlen=CHANGE_FEED_BUFFER)
+        self.subscribers = set()
+        self.last_id = None
+        self.task = None
+
+    @property
+    def available(self):
+        return CHANGE_FEED_ENABLED and self.dsn is not None
+
+    async def start(self):
+        if self.dsn is None:
+            logger.warning("Change feed not started: LISTEN does not work through pgbouncer (DB_PGBOUNCER); "
+                           "set CHANGE_FEED_DATABASE_URL to a direct connection")
+            return
+        self.task = asyncio.create_task(self._listen())
+        logger.info("Change feed started")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        for subscriber in list(self.subscribers):
+            self._close(subscriber)
+
+    def _close(self, subscriber: _Subscriber):
+        subscriber.closed = True
+        self.subscribers.discard(subscriber)
+        try:
+            subscriber.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass  # the client ends once it has drained its queue
+
+    def publish(self, event: dict):
+        # A publish or rollback made by any process drops this process's cached pages of the site
+        if event.get("entity") == "published" and event.get("site"):
+            published_page_cache.invalidate_site(event["site"])
+        self.buffer.append(event)
+        self.last_id = max(self.last_id or 0, event["id"])
+        for subscriber in list(self.subscribers):
+            if subscriber.site and event["site"] != subscriber.site:
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning("Change feed client too slow, disconnecting it")
+                self._close(subscriber)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            self.publish(json.loads(payload))
+        except (ValueError, KeyError):
+            logger.warning("Ignoring malformed change notification: %s", payload)
+
+    # Keep one LISTEN connection open; after a reconnect, catch up on what was missed
+    async def _listen(self):
+        delay = 1
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(CHANGE_CHANNEL, self._on_notify)
+                delay = 1
+                if self.last_id is not None:
+                    for event in await self._events_after(self.last_id, None, limit=None):
+                        self.publish(event)
+                while not closed.is_set():
+                    await self._prune()
+                    try:
+                        await asyncio.wait_for(closed.wait(), PRUNE_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                logger.warning("Change feed connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Change feed listener failed (%s), retrying in %ss", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+    async def _prune(self):
+        async with self.session_factory() as db:
+            await db.execute(delete(ChangeEvent).where(
+                ChangeEvent.created_at < func.now() - timedelta(days=CHANGE_FEED_RETENTION_DAYS)
+            ))
+            await db.commit()
+
+    async def _events_after(self, last_id: int, site: str = None, limit: int = CHANGE_FEED_REPLAY_LIMIT):
+        query = select(ChangeEvent).where(ChangeEvent.id > last_id).order_by(ChangeEvent.id)
+        if site:
+            query = query.where(ChangeEvent.site == site)
+        if limit is not None:
+            query = query.limit(limit + 1)
+        async with self.session_factory() as db:
+            result = await db.execute(query)
+            return [event_dict(row) for row in result.scalars().all()]
+
+    # Events after last_id for a resuming client, or None if there are too many to replay
+    async def _backlog(self, last_id: int, site: str = None):
+        ids = [event["id"] for event in self.buffer]
+        if last_id in ids:
+            events = list(self.buffer)[ids.index(last_id) + 1:]
+            return [event for event in events if not site or event["site"] == site]
+        events = await self._events_after(last_id, site)
+        return None if len(events) > CHANGE_FEED_REPLAY_LIMIT else events
+
+    async def stream(self, site: str = None, last_event_id: int = None):
+        """
+        Server-Sent Events for a client: the backlog after last_event_id (if given), then live
+        events, with a keepalive comment whenever the feed is quiet. A client too far behind
+        gets a `reset` event and should drop everything it cached.
+        """
+        subscriber = _Subscriber(site)
+        self.subscribers.add(subscriber)  # before reading the backlog, so nothing falls in between
+        try:
+            replayed = set()
+            if last_event_id is not None:
+                backlog = await self._backlog(last_event_id, site)
+                if backlog is None:
+                    yield f"event: reset\ndata: {json.dumps({'last_id': self.last_id})}\n\n"
+                else:
+                    for event in backlog:
+                        replayed.add(event["id"])
+                        yield format_event(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), CHANGE_FEED_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if subscriber.closed:
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                if event["id"] not in replayed:
+                    yield format_event(event)
+                if subscriber.closed and subscriber.queue.empty():
+                    break
+        finally:
+            self.subscribers.discard(subscriber)
+
+
+# Shared feed, started and stopped with the application (see app.main)
+change_feed = ChangeFeed(
+    CHANGE_FEED_DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1) if CHANGE_FEED_DATABASE_URL else None,
+    SessionLocal,
+)
@@ -0,0 +1,181 @@
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses are then gzip-compressed only
+    brotli = None
+
+# Response compression tuning (override through the environment / .env)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").strip().lower() in ("1", "true", "yes", "on")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes; smaller bodies are sent as-is
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Content types worth compressing
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+# Sent as-is: each Server-Sent Event must reach the client as soon as it is written
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+# Content codings of an Accept-Encoding header with their q-values ({"gzip": 1.0, "br": 0.0, ...})
+def encoding_weights(accept_encoding: str) -> dict:
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    return weights
+
+
+# Whether a content coding is acceptable: listed with q > 0, or covered by a "*" with q > 0
+def accepts_encoding(weights: dict, encoding: str) -> bool:
+    return weights.get(encoding, weights.get("*", 0.0)) > 0
+
+
+# Pick the encoding for an Accept-Encoding header: br (if available) over gzip, honouring q=0
+def choose_encoding(accept_encoding: str):
+    weights = encoding_weights(accept_encoding)
+    for encoding in (["br"] if brotli else []) + ["gzip"]:
+        if accepts_encoding(weights, encoding):
+            return encoding
+    return None
+
+
+# A strong ETag names one exact body: the compressed body gets its own ("<tag>-gzip"),
+# which app.conditional matches against the uncompressed one
+def encoded_etag(etag: bytes, encoding: str) -> bytes:
+    if etag.startswith(b'"') and etag.endswith(b'"') and len(etag) > 1:
+        return etag[:-1] + b"-" + encoding.encode() + b'"'
+    return etag
+
+
+# Add Accept-Encoding to the response's Vary header (responses of compressible types vary on it
+# whether or not this one was compressed)
+def with_vary(headers: list) -> list:
+    headers = list(headers)
+    for i, (key, value) in enumerate(headers):
+        if key.lower() == b"vary":
+            if value.strip() != b"*" and b"accept-encoding" not in value.lower():
+                headers[i] = (key, value + b", Accept-Encoding")
+            return headers
+    headers.append((b"vary", b"Accept-Encoding"))
+    return headers
+
+
+def _compressible(message) -> bool:
+    headers = {key.lower(): value for key, value in message.get("headers", [])}
+    content_type = headers.get(b"content-type", b"").decode("latin-1")
+    return (b"content-encoding" not in headers and message["status"] not in (204, 304)
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+            and not content_type.startswith(UNCOMPRESSED_TYPES))
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    # With flush, everything passed so far can be decoded by the client (for streamed chunks)
+    def compress(self, data: bytes, flush: bool = True) -> bytes:
+        if self._brotli:
+            return self._brotli.process(data) + (self._brotli.flush() if flush else b"")
+        return self._zlib.compress(data) + (self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+
+    def finish(self) -> bytes:
+        if self._brotli:
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses JSON and text responses with brotli or gzip, as
+    negotiated from Accept-Encoding. Bodies smaller than COMPRESSION_MIN_SIZE are sent
+    as-is, and responses that already carry a Content-Encoding (e.g. pre-compressed
+    snapshot files) are left alone. Streamed responses are compressed chunk by chunk.
+
+    Every response of a compressible type gets Vary: Accept-Encoding, compressed or not,
+    and a compressed body gets its own ETag (see encoded_etag).
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = dict(scope["headers"])
+        accept_encoding = request_headers.get(b"accept-encoding", b"").decode("latin-1")
+        encoding = choose_encoding(accept_encoding) if accept_encoding else None
+        if_none_match = request_headers.get(b"if-none-match", b"")
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                if message["status"] == 304 and encoding:
+                    # Answer with the tag the client holds, if it is the compressed body's
+                    headers = []
+                    for key, value in message.get("headers", []):
+                        if key.lower() == b"etag" and encoded_etag(value, encoding) in if_none_match:
+                            value = encoded_etag(value, encoding)
+                        headers.append((key, value))
+                    message = {**message, "headers": headers}
+                if not _compressible(message):
+                    state["passthrough"] = True
+                    await send(message)
+                elif encoding is None:
+                    state["passthrough"] = True
+                    await send({**message, "headers": with_vary(message.get("headers", []))})
+                else:
+                    state["start"] = message  # held back until we know the body size
+                return
+
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state["start"]
+
+            if start is not None:
+                state["start"] = None
+                if not more_body and len(body) < self.minimum_size:
+                    state["passthrough"] = True
+                    await send({**start, "headers": with_vary(start.get("headers", []))})
+                    await send(message)
+                    return
+                headers = [
+                    (key, encoded_etag(value, encoding) if key.lower() == b"etag" else value)
+                    for key, value in start.get("headers", []) if key.lower() != b"content-length"
+                ]
+                headers.append((b"content-encoding", encoding.encode()))
+                headers = with_vary(headers)
+                state["compressor"] = _Compressor(encoding)
+                if not more_body:
+                    compressed = state["compressor"].compress(body, flush=False) + state["compressor"].finish()
+                    headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send({**start, "headers": headers})
+
+            compressor = state["compressor"]
+            data = compressor.compress(body) if body else b""
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
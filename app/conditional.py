@@ -0,0 +1,101 @@
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import HTTPException, Request, Response
+import hashlib
+
+# Conditional GET support: ETag (and, for single rows, Last-Modified) headers derived from a
+# version tuple, and 304 responses for If-None-Match / If-Modified-Since.
+#
+# Single-row endpoints take the version from the row they load anyway. Collections only run
+# the version query (crud.get_version) when the client sent If-None-Match, and otherwise take
+# it from the rows when the whole collection was loaded. Collections get no Last-Modified:
+# the latest updated_at does not change when a row is deleted or moved out of the collection,
+# while the row count and id checksum in the ETag do.
+
+
+# Build the validators for a version tuple (row count, latest updated_at, id checksum).
+# The request path and query string are part of the ETag, as they select the representation.
+def make_validators(request: Request, version):
+    count, last_updated, checksum = version
+    key = f"{request.url.path}?{request.url.query}|{count}|{last_updated}|{checksum}"
+    etag = '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:24] + '"'
+    last_modified = None
+    if last_updated is not None:
+        if last_updated.tzinfo is None:
+            last_updated = last_updated.replace(tzinfo=timezone.utc)
+        last_modified = last_updated.replace(microsecond=0)
+    return etag, last_modified
+
+
+# Version of rows that are already loaded, in the same form as crud.get_version
+def rows_version(rows):
+    if not rows:
+        return 0, None, None
+    return (len(rows), max((row.updated_at for row in rows if row.updated_at), default=None),
+            sum(row.id for row in rows))
+
+
+# Whether the client sent a validator a collection's version query can answer
+def has_validator(request: Request) -> bool:
+    return "if-none-match" in request.headers
+
+
+# Content codings app.compression appends to the ETag of a compressed body ("<tag>-gzip")
+ENCODING_SUFFIXES = ("-br", "-gzip")
+
+
+# The tag an If-None-Match entry stands for: If-None-Match compares weakly (a W/ prefix does not
+# matter), and a compressed body's tag matches the uncompressed one it was made from
+def _base_tag(tag: str) -> str:
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix + '"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+
+def _not_modified(request: Request, etag: str, last_modified):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in {_base_tag(tag) for tag in tags}
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+    return False
+
+
+def _validator_headers(request: Request, version, single_row: bool):
+    etag, last_modified = make_validators(request, version)
+    if not single_row:
+        last_modified = None
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers, etag, last_modified
+
+
+# Set ETag (and Last-Modified for a single row) on the response, or answer 304 if the client's
+# copy is current. Nothing is done when no rows match, so missing resources still get their 404.
+def check_not_modified(request: Request, response: Response, version, single_row: bool = False):
+    if not version[0]:
+        return
+    headers, etag, last_modified = _validator_headers(request, version, single_row)
+    if _not_modified(request, etag, last_modified):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+
+# Set the validators of a collection whose rows were all loaded (no 304 check)
+def set_validators(request: Request, response: Response, rows):
+    version = rows_version(rows)
+    if version[0]:
+        response.headers.update(_validator_headers(request, version, False)[0])
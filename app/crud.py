@@ -1,144 +1,239 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
-from sqlalchemy import update, delete
-from app.models import Site, Section, Page, Ref, Note
+from sqlalchemy.orm import selectinload, load_only, undefer
+from sqlalchemy import insert, update, delete, func, literal
+from app.models import Site, Section, Page, Ref, Note, PublishingRequest
 from app.schemas import SiteCreate, SiteUpdate, SectionCreate, PageCreate, PageResponse, RefCreate, RefResponse, NoteCreate, NoteResponse, PageCreateResponse
+from app.schemas import SiteResponse, SectionResponse, SiteTreeResponse, SectionTreeResponse, PageTreeResponse, SearchHit
+from app.cache import published_page_cache
+from app.database import reads_primary
+from app.snapshot import export_snapshot
+from app.resolver import resolve_site_id, resolve_section_id, site_id_subquery, section_id_subquery
+from app.publishing import PUBLISH_TABLES, upsert_statement, delete_statement, lock_statement, log_statement, generation_lock_statement
+from app.publishing import refresh_nav_statement, nav_statement
+from app.blue_green import publish_blue_green, rollback_blue_green
+from app.partitions import SITE_PARTITIONS, SITE_PARTITION_TRUNCATE, PARTITIONED_TABLES, create_partitions_statement, drop_partitions_statement, truncate_statement
+import json
 from fastapi import HTTPException
 import logging
 
 # Logger for this file
 logger = logging.getLogger(__name__)
 
+## Versions ...
+
+# Version of the rows a query selects: (row count, latest updated_at, sum of ids).
+# Runs one aggregate over the query's joins and filters without loading any rows;
+# used for ETag / Last-Modified checks (see app.conditional).
+async def get_version(db: AsyncSession, query):
+    model = query.column_descriptions[0]["entity"]
+    result = await db.execute(
+        query.with_only_columns(func.count(model.id), func.max(model.updated_at), func.sum(model.id))
+        .order_by(None)
+    )
+    return tuple(result.one())
+
+## Streaming ...
+
+# Rows fetched per round trip by the streaming listings (and per NDJSON chunk)
+STREAM_BATCH_SIZE = 500
+
+# Yield the rows of a query in batches of STREAM_BATCH_SIZE from a server-side cursor, so
+# memory stays flat however many rows match. Opens its own session from session_factory:
+# the request's session is closed before a streamed body is sent.
+async def stream_rows(session_factory, query, batch_size: int = STREAM_BATCH_SIZE):
+    async with session_factory() as db:
+        result = await db.stream_scalars(query.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            yield rows
+
+# Streamed page listing (see page_listing_query); summary pages are built per batch
+async def stream_pages(session_factory, query, after: int = None, limit: int = None, summary: bool = False):
+    async for pages in stream_rows(session_factory, page_listing_query(query, after, limit, summary)):
+        yield _page_summaries(pages) if summary else pages
+
+## Writes ...
+
+# Every create / update / delete below is one INSERT, UPDATE or DELETE ... RETURNING:
+# parents are resolved by a join or subquery inside the statement, and a write that
+# matches no row returns nothing, which is reported as a 404.
+
+# Columns a response schema reads, for RETURNING
+def returning_columns(model, schema):
+    return [getattr(model, name) for name in schema.model_fields]
+
+# Run a write statement and commit; returns its RETURNING row, or None if it matched no row
+async def _write_one(db: AsyncSession, statement):
+    result = await db.execute(statement.execution_options(synchronize_session=False))
+    row = result.one_or_none()
+    await db.commit()
+    return row
+
+# INSERT ... SELECT of one row whose parent columns (e.g. page_id, site_id) are selected by
+# `parent`; inserts nothing if the parent does not exist
+def _insert_under(model, parent_columns: list, parent, **values):
+    constants = [literal(value, getattr(model, name).type) for name, value in values.items()]
+    return insert(model).from_select([*parent_columns, *values], parent.add_columns(*constants))
+
+# Id and site of a page, for the refs and notes inserted under it
+def _parent_page_query(site_name: str, section_name: str, page_name: str):
+    return (
+        select(Page.id, Page.site_id).join(Section).join(Site)
+        .where(Site.name == site_name, Section.name == section_name, Page.name == page_name)
+    )
+
+# After an insert found no parent, raise the 404 for the first missing one
+async def _raise_missing_parent(db: AsyncSession, site_name: str, section_name: str):
+    site_id = await resolve_site_id(db, site_name)
+    if not site_id:
+        raise HTTPException(status_code=404, detail="Site not found")
+    if not await resolve_section_id(db, site_id, section_name):
+        raise HTTPException(status_code=404, detail="Section not found")
+    raise HTTPException(status_code=404, detail="Page not found")
+
 ## Sites ...
 
+def sites_query():
+    return select(Site)
+
+def site_by_name_query(name: str):
+    return select(Site).filter(Site.name == name)
+
 # Get all sites in the system
 async def get_sites(db: AsyncSession):
-    result = await db.execute(select(Site))
+    result = await db.execute(sites_query())
     return result.scalars().all()
 
 # Get a site by its unique name
 async def get_site_by_name(db: AsyncSession, name: str):
-    result = await db.execute(select(Site).filter(Site.name == name))
+    result = await db.execute(site_by_name_query(name))
     return result.scalar_one_or_none()
 
 # Create a new site
 async def create_site(db: AsyncSession, site: SiteCreate):
-    new_site = Site(**site.dict())
-    db.add(new_site)
-    await db.commit()
-    await db.refresh(new_site)
-    return new_site
+    row = await _write_one(db, insert(Site).values(**site.dict()).returning(*returning_columns(Site, SiteResponse)))
+    return SiteResponse(**row._mapping)
 
 # Update site
 async def update_site(db: AsyncSession, site_name: str, site_data: SiteUpdate):
-    logger.info(f"$$$$$$$$$$$ crud.update_site called with site_name: {site_name}")
-    result = await db.execute(select(Site).filter(Site.name == site_name))
-    logger.info(f"$$$$$$$$$$$ crud.update_site returned: {result}")
-    site = result.scalar_one_or_none()
-    logger.info(f"$$$$$$$$$$$ crud.update_site returned: {site.title}")
-    if not site:
+    logger.info("crud.update_site called with site_name: %s", site_name)
+    row = await _write_one(
+        db,
+        update(Site).where(Site.name == site_name).values(**site_data.dict())
+        .returning(*returning_columns(Site, SiteResponse))
+    )
+    if not row:
         return None
+    return SiteResponse(**row._mapping)
 
-    site.title = site_data.title
-    site.url = site_data.url
-    site.logo = site_data.logo
-    site.favicon = site_data.favicon
-    site.color = site_data.color
-    site.landing_page_id = site_data.landing_page_id
-    await db.commit()
-    await db.refresh(site)
-    logger.info(f"$$$$$$$$$$$ crud.update_site returning: {site.title}")
-    return site
-
-# Delete site
+# Delete site. With SITE_PARTITIONS, its pages, refs and notes go first by dropping their
+# partitions (in the same transaction) rather than by a cascaded row-by-row delete.
 async def delete_site(db: AsyncSession, site_name: str):
-    result = await db.execute(select(Site).filter(Site.name == site_name))
+    if SITE_PARTITIONS:
+        site_id = await resolve_site_id(db, site_name)
+        if site_id is not None:
+            await db.execute(drop_partitions_statement(), {'site_id': site_id})
+    row = await _write_one(db, delete(Site).where(Site.name == site_name).returning(Site.id))
+    return row is not None
+
+# Get a site with all of its sections and pages (and optionally refs and notes).
+# Uses one query per level via selectinload instead of one query per section/page.
+async def get_site_tree(db: AsyncSession, site_name: str, include_refs: bool = False, include_notes: bool = False):
+    pages_loader = selectinload(Site.sections).selectinload(Section.pages)
+    options = [pages_loader.undefer(Page.content)]
+    if include_refs:
+        options.append(pages_loader.selectinload(Page.refs))
+    if include_notes:
+        options.append(pages_loader.selectinload(Page.notes))
+
+    result = await db.execute(select(Site).options(*options).where(Site.name == site_name))
     site = result.scalar_one_or_none()
     if not site:
-        return False
+        return None
 
-    await db.delete(site)
-    await db.commit()
-    return True
+    # Build the response explicitly so unloaded relationships are never touched
+    sections = []
+    for section in site.sections:
+        pages = []
+        for page in section.pages:
+            page_tree = PageTreeResponse(**PageResponse.model_validate(page, from_attributes=True).model_dump())
+            if include_refs:
+                page_tree.refs = [RefResponse.model_validate(ref, from_attributes=True) for ref in page.refs]
+            if include_notes:
+                page_tree.notes = [NoteResponse.model_validate(note, from_attributes=True) for note in page.notes]
+            pages.append(page_tree)
+        sections.append(SectionTreeResponse(
+            **SectionResponse.model_validate(section, from_attributes=True).model_dump(),
+            pages=pages
+        ))
+
+    return SiteTreeResponse(
+        **SiteResponse.model_validate(site, from_attributes=True).model_dump(),
+        sections=sections
+    )
 
 ## Sections ...
 
+def sections_by_site_query(site_name: str):
+    return select(Section).join(Site).where(Site.name == site_name)
+
+def section_details_query(site: str, section_name: str):
+    return (
+        select(Section).join(Site)
+        .where(Site.name == site, Section.name == section_name)
+    )
+
+def section_by_id_query(section_id: int):
+    return (
+        select(Section)
+        .where(Section.id == section_id)
+    )
+
 # Get all sections for a given site
 async def get_sections_by_site(db: AsyncSession, site_name: str):
-    result = await db.execute(
-        select(Section).join(Site).where(Site.name == site_name)
-    )
+    result = await db.execute(sections_by_site_query(site_name))
     return result.scalars().all()
 
 # Get a single section givin its unique name within a site
 async def get_section_details(db: AsyncSession, site: str, section_name: str):
-    result = await db.execute(
-        select(Section).join(Site)
-        .where(Site.name == site, Section.name == section_name)
-    )
+    result = await db.execute(section_details_query(site, section_name))
     return result.scalar_one_or_none()
 
 # Get a single section givin its unique id
 async def get_section_details_by_id(db: AsyncSession, section_id: int):
-    result = await db.execute(
-        select(Section)
-        .where(Section.id == section_id)
-    )
+    result = await db.execute(section_by_id_query(section_id))
     return result.scalar_one_or_none()
 
 # Create a new section
 async def create_section(db: AsyncSession, section: SectionCreate):
-    logger.info(f"%%%%%%%%%% Calling create_section")
-    site = await db.execute(select(Site).where(Site.name == section.site_name))
-    site_instance = site.scalar_one_or_none()
-    if not site_instance:
+    logger.info("crud.create_section called for site: %s", section.site_name)
+    row = await _write_one(db, _insert_under(
+        Section, ["site_id"], select(Site.id).where(Site.name == section.site_name),
+        name=section.name, title=section.title, label=section.label,
+    ).returning(*returning_columns(Section, SectionResponse)))
+    if not row:
         raise HTTPException(status_code=404, detail="Site not found")
-
-    logger.info(f"%%%%%%%%%% Found site: {section.site_name}")
-
-    new_section = Section(
-        site_id=site_instance.id,
-        name=section.name,
-        title=section.title,
-        label=section.label
-    )
-    
-    logger.info(f"%%%%%%%%%% Created a new section for site: {site_instance.id}")
-
-    db.add(new_section)
-    await db.commit()
-    await db.refresh(new_section)
-    return new_section
+    return SectionResponse(**row._mapping)
 
 # Update a section
 async def update_section(db: AsyncSession, section_id: int, section: SectionCreate):
-    logger.info(f"crud. update_section called with section id: {section_id}")
-    query = await db.execute(select(Section).where(Section.id == section_id))
-    section_instance = query.scalar_one_or_none()
-
-    if not section_instance:
+    logger.info("crud. update_section called with section id: %s", section_id)
+    row = await _write_one(
+        db,
+        update(Section).where(Section.id == section_id)
+        .values(name=section.name, title=section.title, label=section.label)
+        .returning(*returning_columns(Section, SectionResponse))
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Section not found")
-
-    section_instance.name = section.name
-    section_instance.title = section.title
-    section_instance.label = section.label
-
-    await db.commit()
-    await db.refresh(section_instance)
-    return section_instance
+    return SectionResponse(**row._mapping)
 
 # Delete a section
 async def delete_section(db: AsyncSession, section_id: int):
-    query = await db.execute(select(Section).where(Section.id == section_id))
-    section_instance = query.scalar_one_or_none()
-
-    if not section_instance:
+    row = await _write_one(db, delete(Section).where(Section.id == section_id).returning(Section.id))
+    if not row:
         raise HTTPException(status_code=404, detail="Section not found")
 
-    await db.delete(section_instance)
-    await db.commit()
-
 ## Pages ...
 
 # async def get_pages_by_section(db: AsyncSession, section_name: str):
@@ -153,96 +248,154 @@ async def get_pages_by_section(db: AsyncSession, site: str, section: str):
     )
     return result.scalars().all()
 
-# Fetch Pages by Section
-async def get_pages_by_section(db: AsyncSession, site_name: str, section_name: str):
-    logger.info(f"$$$$$$$$$ crud.get_pages_by_section called with {site_name}, {section_name}")
-    result = await db.execute(
+# Page columns needed for listings (summary mode leaves the content column out of the SQL)
+PAGE_SUMMARY_COLUMNS = (Page.id, Page.section_id, Page.name, Page.title, Page.primary_image, Page.abstract)
+
+# Apply keyset pagination and summary mode to a page listing query.
+# Pages are ordered by id; `after` is the last id of the previous batch.
+def page_listing_query(query, after: int = None, limit: int = None, summary: bool = False):
+    query = query.order_by(Page.id)
+    if after is not None:
+        query = query.where(Page.id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    if summary:
+        return query.options(load_only(*PAGE_SUMMARY_COLUMNS, raiseload=True))
+    return query.options(undefer(Page.content))
+
+# Summary-mode pages as response models (their other columns are not loaded)
+def _page_summaries(pages):
+    return [
+        PageResponse(**{column.key: getattr(page, column.key) for column in PAGE_SUMMARY_COLUMNS})
+        for page in pages
+    ]
+
+async def _list_pages(db: AsyncSession, query, after: int = None, limit: int = None, summary: bool = False):
+    result = await db.execute(page_listing_query(query, after, limit, summary))
+    pages_found = result.scalars().all()
+    return _page_summaries(pages_found) if summary else pages_found
+
+# Queries on pages, refs and notes also filter on site_id (site_id_subquery, resolved in the
+# query itself so it never goes stale), so that with partitioning (scripts/database/partition_by_site.sql)
+# only the site's partition is scanned
+def pages_by_section_query(site_name: str, section_name: str):
+    return (
         select(Page)
         .join(Section)
         .join(Site)
         .filter(Site.name == site_name)
         .filter(Section.name == section_name)
+        .filter(Page.site_id == site_id_subquery(site_name))
     )
-    pages_found = result.scalars().all()
-    return pages_found
-    # return result.scalars().all()
 
-# Fetch Pages by Site
-async def get_pages_by_site(db: AsyncSession, site_name: str):
-    logger.info(f"$$$$$$$$$ crud.get_pages_by_site called with {site_name}")
-    result = await db.execute(
+def pages_by_site_query(site_name: str):
+    return (
         select(Page)
         .join(Section)
         .join(Site)
         .filter(Site.name == site_name)
+        .filter(Page.site_id == site_id_subquery(site_name))
     )
-    pages_found = result.scalars().all()
-    return pages_found
-    # return result.scalars().all()
 
-# Create a new page
-async def create_page(db: AsyncSession, page_data: PageCreate):
-    site = await db.execute(select(Site).where(Site.name == page_data.site_name))
-    site_instance = site.scalar_one_or_none()
-    if not site_instance:
-        raise HTTPException(status_code=404, detail="Site not found")
+# Fetch Pages by Section
+async def get_pages_by_section(db: AsyncSession, site_name: str, section_name: str,
+                               after: int = None, limit: int = None, summary: bool = False):
+    logger.info("$$$$$$$$$ crud.get_pages_by_section called with %s, %s", site_name, section_name)
+    return await _list_pages(db, pages_by_section_query(site_name, section_name), after, limit, summary)
 
-    section = await db.execute(select(Section).where(Section.name == page_data.section_name))
-    section_instance = section.scalar_one_or_none()
-    if not section_instance:
-        raise HTTPException(status_code=404, detail="Section not found")
+# Fetch Pages by Site
+async def get_pages_by_site(db: AsyncSession, site_name: str,
+                            after: int = None, limit: int = None, summary: bool = False):
+    logger.info("$$$$$$$$$ crud.get_pages_by_site called with %s", site_name)
+    return await _list_pages(db, pages_by_site_query(site_name), after, limit, summary)
+
+# Text search configuration used by the search_vector columns (see schema.sql)
+SEARCH_CONFIG = "english"
+SEARCH_HEADLINE_OPTIONS = "MaxFragments=2, MaxWords=30, MinWords=10, StartSel=<mark>, StopSel=</mark>"
+
+# Full-text search over page title, abstract and content, ranked, with highlighted snippets.
+# Ranking and paging run against the GIN-indexed search_vector first; snippets are only
+# built for the returned page of hits.
+async def search_pages(db: AsyncSession, site_name: str, q: str, limit: int = 20, offset: int = 0,
+                       published: bool = False):
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = func.ts_rank(Page.search_vector, ts_query).label("rank")
+    hits = (
+        select(Page.id, rank)
+        .join(Section).join(Site)
+        .where(Site.name == site_name, Page.site_id == site_id_subquery(site_name),
+               Page.search_vector.op("@@")(ts_query))
+        .order_by(rank.desc(), Page.id)
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+    snippet = func.ts_headline(SEARCH_CONFIG, func.coalesce(Page.content, ""), ts_query, SEARCH_HEADLINE_OPTIONS)
+    query = (
+        select(Page.id, Page.section_id, Section.name.label("section_name"), Page.name, Page.title,
+               hits.c.rank, snippet.label("snippet"))
+        .join(hits, hits.c.id == Page.id)
+        .join(Section)
+        .order_by(hits.c.rank.desc(), Page.id)
+    )
+    if published:
+        query = query.execution_options(schema_translate_map={'draft': 'published'})
+
+    result = await db.execute(query)
+    return [SearchHit(**row._mapping) for row in result.all()]
 
-    new_page = Page(
-        section_id=section_instance.id,
-        name=page_data.name,
-        title=page_data.title,
-        primary_image=page_data.primary_image,
-        abstract=page_data.abstract,
-        content=page_data.content
+# Create a new page
+async def create_page(db: AsyncSession, page_data: PageCreate):
+    section = (
+        select(Section.id, Section.site_id).join(Site)
+        .where(Site.name == page_data.site_name, Section.name == page_data.section_name)
     )
-    logger.info(f"############ Creating a new page: {new_page.name}")
-    db.add(new_page)
-    logger.info(f"############ New page added: {new_page.name}")
-    await db.commit()
-    logger.info(f"############ New page committed: {new_page.name}")
-    await db.refresh(new_page)
-    logger.info(f"############ New page refreshed: {new_page.name}")
+    row = await _write_one(db, _insert_under(
+        Page, ["section_id", "site_id"], section,
+        name=page_data.name, title=page_data.title, primary_image=page_data.primary_image,
+        abstract=page_data.abstract, content=page_data.content,
+    ).returning(*returning_columns(Page, PageResponse)))
+    if not row:
+        await _raise_missing_parent(db, page_data.site_name, page_data.section_name)
+    logger.info("############ New page created: %s", row.name)
 
     return PageCreateResponse(
-        id=new_page.id,
-        site_name=site_instance.name,
-        section_name=section_instance.name,
-        name=new_page.name,
-        title=new_page.title,
-        primary_image=new_page.primary_image,
-        abstract=new_page.abstract,
-        content=new_page.content
+        site_name=page_data.site_name,
+        section_name=page_data.section_name,
+        **row._mapping
     )
 
-# Single page retrieval
-async def get_page_details(db: AsyncSession, site: str, section: str, page_name: str):
-    result = await db.execute(
+def page_details_query(site: str, section: str, page_name: str):
+    return (
         select(Page).join(Section).join(Site)
         .where(
             Site.name == site,
             Section.name == section,
-            Page.name == page_name
+            Page.name == page_name,
+            Page.site_id == site_id_subquery(site)
         )
     )
-    page = result.scalar_one_or_none()
-    if not page:
-        raise HTTPException(status_code=404, detail="Page not found")
-    return page
 
-# Single page retrieval by ID
-async def get_page_details_by_id(db: AsyncSession, page_id: int):
-    result = await db.execute(
+def page_by_id_query(page_id: int):
+    return (
         select(Page).join(Section)
         .where(
             Section.id == Page.section_id,
             Page.id == page_id
         )
     )
+
+# Single page retrieval
+async def get_page_details(db: AsyncSession, site: str, section: str, page_name: str):
+    result = await db.execute(page_details_query(site, section, page_name).options(undefer(Page.content)))
+    page = result.scalar_one_or_none()
+    if not page:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return page
+
+# Single page retrieval by ID
+async def get_page_details_by_id(db: AsyncSession, page_id: int):
+    result = await db.execute(page_by_id_query(page_id).options(undefer(Page.content)))
     page = result.scalar_one_or_none()
     if not page:
         raise HTTPException(status_code=404, detail="Page not found")
@@ -250,253 +403,248 @@ async def get_page_details_by_id(db: AsyncSession, page_id: int):
 
 # Update a page
 async def update_page(db: AsyncSession, page_name: str, page: PageCreate):
-    query = await db.execute(select(Page).join(Section).join(Site)
-        .where(Page.name == page_name,
-               Section.name == page.section_name,
-               Site.name == page.site_name
-        )
+    row = await _write_one(
+        db,
+        update(Page)
+        .where(Page.site_id == site_id_subquery(page.site_name),
+               Page.section_id == section_id_subquery(page.site_name, page.section_name), Page.name == page_name)
+        .values(name=page.name, title=page.title, primary_image=page.primary_image,
+                abstract=page.abstract, content=page.content)
+        .returning(*returning_columns(Page, PageResponse))
     )
-    page_instance = query.scalar_one_or_none()
-
-    if not page_instance:
+    if not row:
         raise HTTPException(status_code=404, detail="Page not found")
+    return PageResponse(**row._mapping)
 
-    section_query = await db.execute(select(Section).join(Site)
-                                     .where(Section.name == page.section_name, 
-                                            Site.name == page.site_name))
-    section_instance = section_query.scalar_one_or_none()
-    if not section_instance:
-        raise HTTPException(status_code=404, detail="Section not found")
-
-    page_instance.section_id = section_instance.id
-    page_instance.name = page.name
-    page_instance.title = page.title
-    page_instance.primary_image = page.primary_image
-    page_instance.abstract = page.abstract
-    page_instance.content = page.content
-
-    await db.commit()
-    await db.refresh(page_instance)
-    return page_instance
-
-# Update a page
+# Update a page (and move it to the given section)
 async def update_page_by_id(db: AsyncSession, page_id: int, page: PageCreate):
-    query = await db.execute(select(Page).where(Page.id == page_id))
-    page_instance = query.scalar_one_or_none()
-
-    if not page_instance:
-        raise HTTPException(status_code=404, detail="Page not found")
-
-    section_query = await db.execute(select(Section).join(Site)
-                                     .where(Section.name == page.section_name, 
-                                            Site.name == page.site_name))
-    section_instance = section_query.scalar_one_or_none()
-    if not section_instance:
-        raise HTTPException(status_code=404, detail="Section not found")
-
-    page_instance.section_id = section_instance.id
-    page_instance.name = page.name
-    page_instance.title = page.title
-    page_instance.abstract = page.abstract
-    page_instance.content = page.content
-
-    await db.commit()
-    await db.refresh(page_instance)
-    return page_instance
+    section_id = section_id_subquery(page.site_name, page.section_name)
+    row = await _write_one(
+        db,
+        update(Page).where(Page.id == page_id, section_id.is_not(None))
+        .values(section_id=section_id, site_id=site_id_subquery(page.site_name),
+                name=page.name, title=page.title, primary_image=page.primary_image,
+                abstract=page.abstract, content=page.content)
+        .returning(*returning_columns(Page, PageResponse))
+    )
+    if not row:
+        result = await db.execute(select(Page.id).where(Page.id == page_id))
+        raise HTTPException(status_code=404, detail="Section not found" if result.scalar() else "Page not found")
+    return PageResponse(**row._mapping)
 
 # Delete a page
 async def delete_page(db: AsyncSession, page_id: int):
-    query = await db.execute(select(Page).where(Page.id == page_id))
-    page_instance = query.scalar_one_or_none()
-
-    if not page_instance:
+    row = await _write_one(db, delete(Page).where(Page.id == page_id).returning(Page.id))
+    if not row:
         raise HTTPException(status_code=404, detail="Page not found")
 
-    await db.delete(page_instance)
-    await db.commit()
-
 ## Publishing ...
 
-# Publish a site (copy from draft schema to published schema)
-async def publish_site(db: AsyncSession, site_name: str):
-    logger.info(f"^^^^^^^^^^^^^ publish_site called for site: {site_name}")
-    # Copy site
-    await db.execute(f"""
-        INSERT INTO published.sites (id, name, title)
-        SELECT id, name, title FROM draft.sites WHERE name = :site_name
-        ON CONFLICT (id) DO UPDATE SET name=EXCLUDED.name, title=EXCLUDED.title
-    """, {'site_name': site_name})
-
-    logger.info(f"^^^^^^^^^^^^^ Site copied for: {site_name}")
-
-    # Copy sections
-    await db.execute(f"""
-        INSERT INTO published.sections (id, site_id, name, title)
-        SELECT sections.id, sections.site_id, sections.name, sections.title
-        FROM draft.sections
-        JOIN draft.sites ON draft.sections.site_id = draft.sites.id
-        WHERE draft.sites.name = :site_name
-        ON CONFLICT (id) DO UPDATE SET 
-            site_id=EXCLUDED.site_id, name=EXCLUDED.name, title=EXCLUDED.title
-    """, {'site_name': site_name})
-
-    logger.info(f"^^^^^^^^^^^^^ Sections copied for: {site_name}")
-
-    # Copy pages
-    await db.execute(f"""
-        INSERT INTO published.pages (id, section_id, name, title, abstract, content)
-        SELECT pages.id, pages.section_id, pages.name, pages.title, pages.abstract, pages.content
-        FROM draft.pages
-        JOIN draft.sections ON pages.section_id = sections.id
-        JOIN draft.sites ON sections.site_id = sites.id
-        WHERE sites.name = :site_name
-        ON CONFLICT (id) DO UPDATE SET 
-            section_id=EXCLUDED.section_id, name=EXCLUDED.name, title=EXCLUDED.title,
-            abstract=EXCLUDED.abstract, content=EXCLUDED.content
-    """, {'site_name': site_name})
-
-    logger.info(f"^^^^^^^^^^^^^ Pages copied for: {site_name}")
+# Publish a site (copy from draft schema to published schema).
+# Incremental mode only writes rows that were added or changed since the last publish.
+# Published rows whose draft row was deleted are removed in both modes (before the copy).
+# `progress`, if given, is awaited with (table, stats) after each table is done.
+# With `snapshot`, a pre-compressed static copy of the published site is written afterwards; if
+# that fails, the publish still stands and the error is returned as stats["snapshot_error"].
+# With `blue_green`, the site is published by swapping in a rebuilt published schema instead
+# (see app.blue_green); published rows are then never written in place.
+async def publish_site(db: AsyncSession, site_name: str, incremental: bool = False, progress=None,
+                       snapshot: bool = False, blue_green: bool = False):
+    logger.info("^^^^^^^^^^^^^ publish_site called for site: %s, incremental: %s, blue_green: %s",
+                site_name, incremental, blue_green)
+    params = {'site_name': site_name}
+    stats = {}
+
+    await db.execute(lock_statement(), params)
+    params['site_id'] = await db.scalar(select(Site.id).where(Site.name == site_name))  # not cached: partitions go by id
+    if blue_green:
+        stats = await publish_blue_green(db, site_name, progress)
+        return await _finish_publish(db, site_name, snapshot, stats)
+
+    # With SITE_PARTITION_TRUNCATE, a full publish empties the site's published pages, refs and notes
+    # with one TRUNCATE and copies them again, instead of upserting every row and deleting the stale
+    # ones. TRUNCATE holds the site's partitions exclusively until commit, so such a publish runs
+    # alone: two of them would otherwise deadlock refreshing the navigation view over each other's
+    # partitions.
+    truncating = SITE_PARTITIONS and SITE_PARTITION_TRUNCATE and not incremental and params['site_id'] is not None
+    await db.execute(generation_lock_statement(shared=not truncating), params)
+
+    truncated = []
+    if truncating:
+        await db.execute(create_partitions_statement(), params)
+        await db.execute(truncate_statement(params['site_id']))
+        truncated = PARTITIONED_TABLES
+
+    # Remove rows deleted in draft first (children first; truncated tables have none), so that a
+    # new row reusing a deleted row's name (e.g. a recreated page) does not clash with it
+    for table, _ in reversed(PUBLISH_TABLES):
+        if table in truncated:
+            stats[table] = {"truncated": True}
+            continue
+        result = await db.execute(delete_statement(table), params)
+        stats[table] = {"deleted": result.rowcount}
+
+    # Copy sites, sections, pages, refs and notes (parents first)
+    for table, columns in PUBLISH_TABLES:
+        result = await db.execute(upsert_statement(table, columns, incremental), params)
+        stats[table]["upserted"] = result.rowcount
+        logger.info("^^^^^^^^^^^^^ %s copied for: %s (%s rows)", table, site_name, result.rowcount)
+        if progress:
+            await progress(table, stats[table])
+
+    await db.execute(refresh_nav_statement())
+
+    details = json.dumps({"mode": "incremental" if incremental else "full", "tables": stats})
+    await db.execute(log_statement(), {**params, 'action': 'publish', 'details': details})
+
+    return await _finish_publish(db, site_name, snapshot, stats)
+
+# Commit a publish (or rollback) of the published copy and refresh what is derived from it.
+# The snapshot is written after the commit, so its errors are returned in the stats, not raised.
+async def _finish_publish(db: AsyncSession, site_name: str, snapshot: bool = False, stats: dict = None):
+    stats = {} if stats is None else stats
+    await db.commit()
+    published_page_cache.invalidate_site(site_name)
+    logger.info("^^^^^^^^^^^^^ Published completed and committed for: %s", site_name)
+
+    if snapshot:
+        try:
+            await export_snapshot(db, site_name)
+        except Exception as e:
+            logger.exception("^^^^^^^^^^^^^ Snapshot export failed for: %s", site_name)
+            stats["snapshot_error"] = str(e) or type(e).__name__
+    return stats
+
+# Roll the published copy back to the generation before the latest blue/green publish of the site
+async def rollback_published_site(db: AsyncSession, site_name: str, snapshot: bool = False):
+    if not await resolve_site_id(db, site_name):
+        raise HTTPException(status_code=404, detail="Site not found")
+    await db.execute(lock_statement(), {'site_name': site_name})
+    await rollback_blue_green(db, site_name)
+    return await _finish_publish(db, site_name, snapshot)
+
+# Queue a publish of a site; app.publish_queue runs it in the background
+async def create_publish_job(db: AsyncSession, site_name: str, incremental: bool = False, snapshot: bool = False,
+                             blue_green: bool = False):
+    if incremental and blue_green:
+        raise HTTPException(status_code=422, detail="A blue/green publish always rebuilds the site; drop incremental")
+    site = await get_site_by_name(db, site_name)
+    if not site:
+        raise HTTPException(status_code=404, detail="Site not found")
 
+    job = PublishingRequest(site_id=site.id, status="pending", incremental=incremental, snapshot=snapshot,
+                            blue_green=blue_green)
+    db.add(job)
     await db.commit()
-    logger.info(f"^^^^^^^^^^^^^ Published completed and committed for: {site_name}")
+    await db.refresh(job)
+    return job
 
-# Get published page
+# Get a publish job by id
+async def get_publish_job(db: AsyncSession, job_id: int):
+    result = await db.execute(select(PublishingRequest).where(PublishingRequest.id == job_id))
+    return result.scalar_one_or_none()
+
+# Get published page (served from the in-process cache until the site is republished).
+# Only rows read from the primary are cached: a lagging replica could refill the cache with
+# the page as it was before the publish, so replica reads are returned but not kept.
 async def get_published_page(db: AsyncSession, site_name: str, page_name: str):
+    cached = published_page_cache.get((site_name, page_name))
+    if cached is not None:
+        return cached
+    generation = published_page_cache.generation(site_name)  # a publish during the query voids this read
+
     result = await db.execute(
         select(Page).join(Section).join(Site)
-        .options(selectinload(Page.section))
         .where(
             Site.name == site_name,
-            Page.name == page_name
-        ).execution_options(schema_translate_map={'schema': 'published'})
+            Page.name == page_name,
+            Page.site_id == site_id_subquery(site_name)
+        ).options(undefer(Page.content))
+        .execution_options(schema_translate_map={'draft': 'published'})
     )
+    page = result.scalar_one_or_none()
+    if not page:
+        return None
+
+    page_response = PageResponse.model_validate(page, from_attributes=True)
+    if reads_primary(db):
+        published_page_cache.set((site_name, page_name), page_response, generation)
+    return page_response
+
+
+# Navigation of a published site as JSON text (sections by sort_order with their page names and
+# titles), read from the published.site_nav materialized view
+async def get_published_nav(db: AsyncSession, site_name: str):
+    result = await db.execute(nav_statement(), {'site_name': site_name})
     return result.scalar_one_or_none()
 
 
-async def get_refs_by_page(db: AsyncSession, site: str, section: str, page: str):
-    result = await db.execute(
+def refs_by_page_query(site: str, section: str, page: str):
+    return (
         select(Ref).join(Page).join(Section).join(Site)
-        .where(Site.name == site, Section.name == section, Page.name == page)
+        .where(Site.name == site, Section.name == section, Page.name == page,
+               Ref.site_id == site_id_subquery(site), Page.site_id == site_id_subquery(site))
+        .order_by(Ref.id)
     )
+
+async def get_refs_by_page(db: AsyncSession, site: str, section: str, page: str):
+    result = await db.execute(refs_by_page_query(site, section, page))
     return result.scalars().all()
 
 # Create a new ref
 async def create_ref(db: AsyncSession, ref_data: RefCreate):
-    site = await db.execute(select(Site).where(Site.name == ref_data.site_name))
-    site_instance = site.scalar_one_or_none()
-    if not site_instance:
-        raise HTTPException(status_code=404, detail="Site not found")
-
-    section = await db.execute(select(Section).where(Section.site_id == site_instance.id, Section.name == ref_data.section_name))
-    section_instance = section.scalar_one_or_none()
-    if not section_instance:
-        raise HTTPException(status_code=404, detail="Section not found")
-
-    page = await db.execute(select(Page).where(Page.section_id == section_instance.id, Page.name == ref_data.page_name))
-    page_instance = page.scalar_one_or_none()
-    if not page_instance:
-        raise HTTPException(status_code=404, detail="Page not found")
-
-    new_ref = Ref(
-        page_id=page_instance.id,
-        description=ref_data.description,
-        url=ref_data.url,
-    )
-    logger.info(f"############ Creating a new ref: {new_ref.description}")
-    db.add(new_ref)
-    logger.info(f"############ New ref added: {new_ref.description}")
-    await db.commit()
-    logger.info(f"############ New ref committed: {new_ref.description}")
-    await db.refresh(new_ref)
-    logger.info(f"############ New ref refreshed: {new_ref.description}")
-
-    return RefResponse(
-        id=new_ref.id,
-        page_id=new_ref.page_id,
-        url=new_ref.url,
-        type=new_ref.type,
-        description=new_ref.description
-    )
+    row = await _write_one(db, _insert_under(
+        Ref, ["page_id", "site_id"], _parent_page_query(ref_data.site_name, ref_data.section_name, ref_data.page_name),
+        description=ref_data.description, url=ref_data.url,
+    ).returning(*returning_columns(Ref, RefResponse)))
+    if not row:
+        await _raise_missing_parent(db, ref_data.site_name, ref_data.section_name)
+    logger.info("############ New ref created: %s", row.description)
+    return RefResponse(**row._mapping)
 
 # Update a ref
 async def update_ref(db: AsyncSession, ref_id: int, ref: RefCreate):
-    logger.info(f"crud. update_ref called with ref id: {ref_id}")
-    query = await db.execute(select(Ref).where(Ref.id == ref_id))
-    ref_instance = query.scalar_one_or_none()
-
-    if not ref_instance:
+    logger.info("crud. update_ref called with ref id: %s", ref_id)
+    row = await _write_one(
+        db,
+        update(Ref).where(Ref.id == ref_id).values(description=ref.description, url=ref.url)
+        .returning(*returning_columns(Ref, RefResponse))
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Ref not found")
-
-    ref_instance.description = ref.description
-    ref_instance.url = ref.url
-
-    await db.commit()
-    await db.refresh(ref_instance)
-    return ref_instance
+    return RefResponse(**row._mapping)
 
 
 # Delete a ref
 async def delete_ref(db: AsyncSession, ref_id: int):
-    query = await db.execute(select(Ref).where(Ref.id == ref_id))
-    ref_instance = query.scalar_one_or_none()
-
-    if not ref_instance:
+    if not await _write_one(db, delete(Ref).where(Ref.id == ref_id).returning(Ref.id)):
         raise HTTPException(status_code=404, detail="Ref not found")
 
-    await db.delete(ref_instance)
-    await db.commit()
-
 
-async def get_notes_by_page(db: AsyncSession, site: str, section: str, page: str):
-    result = await db.execute(
+def notes_by_page_query(site: str, section: str, page: str):
+    return (
         select(Note).join(Page).join(Section).join(Site)
-        .where(Site.name == site, Section.name == section, Page.name == page)
+        .where(Site.name == site, Section.name == section, Page.name == page,
+               Note.site_id == site_id_subquery(site), Page.site_id == site_id_subquery(site))
+        .order_by(Note.id)
     )
+
+async def get_notes_by_page(db: AsyncSession, site: str, section: str, page: str):
+    result = await db.execute(notes_by_page_query(site, section, page))
     return result.scalars().all()
 
 # Create a new note
 async def create_note(db: AsyncSession, note_data: NoteCreate):
-    site = await db.execute(select(Site).where(Site.name == note_data.site_name))
-    site_instance = site.scalar_one_or_none()
-    if not site_instance:
-        raise HTTPException(status_code=404, detail="Site not found")
-
-    section = await db.execute(select(Section).where(Section.site_id == site_instance.id, Section.name == note_data.section_name))
-    section_instance = section.scalar_one_or_none()
-    if not section_instance:
-        raise HTTPException(status_code=404, detail="Section not found")
-
-    page = await db.execute(select(Page).where(Page.section_id == section_instance.id, Page.name == note_data.page_name))
-    page_instance = page.scalar_one_or_none()
-    if not page_instance:
-        raise HTTPException(status_code=404, detail="Page not found")
-
-    new_note = Note(
-        page_id=page_instance.id,
+    row = await _write_one(db, _insert_under(
+        Note, ["page_id", "site_id"], _parent_page_query(note_data.site_name, note_data.section_name, note_data.page_name),
         note=note_data.note,
-    )
-    logger.info(f"############ Creating a new note: {new_note.id}")
-    db.add(new_note)
-    logger.info(f"############ New note added: {new_note.id}")
-    await db.commit()
-    logger.info(f"############ New note committed: {new_note.id}")
-    await db.refresh(new_note)
-    logger.info(f"############ New note refreshed: {new_note.id}")
-
-    return NoteResponse(
-        id=new_note.id,
-        page_id=new_note.page_id,
-        note=new_note.note,
-    )
+    ).returning(*returning_columns(Note, NoteResponse)))
+    if not row:
+        await _raise_missing_parent(db, note_data.site_name, note_data.section_name)
+    logger.info("############ New note created: %s", row.id)
+    return NoteResponse(**row._mapping)
 
 # Delete a note
 async def delete_note(db: AsyncSession, note_id: int):
-    query = await db.execute(select(Note).where(Note.id == note_id))
-    note_instance = query.scalar_one_or_none()
-
-    if not note_instance:
+    if not await _write_one(db, delete(Note).where(Note.id == note_id).returning(Note.id)):
         raise HTTPException(status_code=404, detail="Note not found")
-
-    await db.delete(note_instance)
-    await db.commit()
-
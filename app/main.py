@@ -1,11 +1,55 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routes import sites, sections, pages, refs, notes, publish
+from fastapi.responses import PlainTextResponse
+from app.database import engine, publish_engine, replica_engines
+from app.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from app.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from app.responses import FastJSONResponse
+from app.read_routing import ReadYourWritesMiddleware
+from app.tracing import RequestIdMiddleware, instrument_slow_queries
+from app.routes import sites, sections, pages, refs, notes, publish, bulk, search, snapshot, internal, changes
+from app.publish_queue import publish_queue
+from app.change_feed import CHANGE_FEED_ENABLED, change_feed
 from utils.logging import setup_logging
+import os
 
-# Set up logging for the application
-setup_logging(log_level="DEBUG", log_file="logs/guten_datalake.log")
+# Set up logging for the application (LOG_PROFILE / LOG_LEVEL / LOG_SAMPLING from the environment)
+setup_logging(log_file="logs/guten_datalake.log",
+              slow_query_file=os.getenv("SLOW_QUERY_LOG", "logs/slow_queries.jsonl"))
 
-app = FastAPI()
+# Start and stop background services with the application
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await publish_queue.start()
+    if CHANGE_FEED_ENABLED:
+        await change_feed.start()
+    yield
+    await change_feed.stop()
+    await publish_queue.stop()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# gzip / brotli for JSON and text bodies above COMPRESSION_MIN_SIZE
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Per-route latency histograms and per-request SQL counts, exported at /metrics
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine, "api")
+instrument_engine(publish_engine, "publish")
+for i, replica in enumerate(replica_engines):
+    instrument_engine(replica, f"replica{i}")
+
+# With read replicas, keep clients on the primary for a few seconds after they write
+if replica_engines:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Request ids for log correlation, and the slow-query log (added last so it wraps everything)
+app.add_middleware(RequestIdMiddleware)
+instrument_slow_queries(engine, "api")
+instrument_slow_queries(publish_engine, "publish")
+for i, replica in enumerate(replica_engines):
+    instrument_slow_queries(replica, f"replica{i}")
 
 # app.include_router(sites.router, prefix="/guten", tags=["Sites"])
 # app.include_router(pages.router, prefix="/guten", tags=["Pages"])
@@ -15,7 +59,17 @@ app.include_router(pages.router, prefix="/guten", tags=["Pages"])
 app.include_router(refs.router, prefix="/guten", tags=["Refs"])
 app.include_router(notes.router, prefix="/guten", tags=["Notes"])
 app.include_router(publish.router, prefix="/guten", tags=["Publishing"])
+app.include_router(bulk.router, prefix="/guten", tags=["Bulk"])
+app.include_router(search.router, prefix="/guten", tags=["Search"])
+app.include_router(snapshot.router, prefix="/guten", tags=["Snapshots"])
+app.include_router(changes.router, prefix="/guten", tags=["Changes"])
+app.include_router(internal.router, prefix="/guten", tags=["Internal"])
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to guten-datalake API"}
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,160 @@
+from contextvars import ContextVar
+from sqlalchemy import event
+import bisect
+import time
+
+# Minimal in-process metrics exported in the Prometheus text format at /metrics:
+# request latency per route template, and SQL query counts / DB time per request
+# collected from SQLAlchemy cursor events.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.label_names, key)))} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):  # larger values only count towards +Inf
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series.items()):
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "guten_http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "guten_http_request_db_queries", "SQL statements executed per HTTP request",
+    ("method", "route"), buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    "guten_http_request_db_seconds", "Time spent executing SQL per HTTP request",
+    ("method", "route"),
+)
+DB_QUERIES = Counter("guten_db_queries_total", "SQL statements executed (including background work)", ("engine",))
+DB_TIME = Counter("guten_db_seconds_total", "Time spent executing SQL (including background work)", ("engine",))
+
+METRICS = [REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, DB_QUERIES, DB_TIME]
+
+
+class RequestDbStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+# Stats of the HTTP request being handled in the current task (None outside requests)
+current_request_stats = ContextVar("current_request_stats", default=None)
+
+
+# Count statements and time on an engine; per-request totals go to the current request's stats
+def instrument_engine(engine, name: str):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        DB_QUERIES.inc(engine=name)
+        DB_TIME.inc(elapsed, engine=name)
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and SQL usage per route template (e.g. /guten/pages/{page_name})."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDbStats()
+        token = current_request_stats.set(stats)
+        status = {"code": 500}
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            current_request_stats.reset(token)
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_LATENCY.observe(duration, method=method, route=template, status=status["code"])
+            REQUEST_QUERIES.observe(stats.queries, method=method, route=template)
+            REQUEST_DB_TIME.observe(stats.db_time, method=method, route=template)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, Text, Boolean, DateTime, func
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -17,6 +18,11 @@ class Site(Base):
     favicon = Column(String, nullable=True)
     color = Column(String, nullable=True)
     landing_page_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    # Children are removed by ON DELETE CASCADE in the database (passive_deletes)
+    sections = relationship("Section", back_populates="site", order_by="[Section.sort_order, Section.id]",
+                            cascade="all, delete-orphan", passive_deletes=True)
 
 # Define Section Table in Draft Schema
 class Section(Base):
@@ -28,6 +34,12 @@ class Section(Base):
     name = Column(String, index=True)
     title = Column(String, nullable=False)
     label = Column(String, nullable=True)
+    sort_order = Column(Integer, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    site = relationship("Site", back_populates="sections")
+    pages = relationship("Page", back_populates="section", order_by="[Page.sort_order, Page.id]",
+                         cascade="all, delete-orphan", passive_deletes=True)
 
 # Define Page Table in Draft Schema
 class Page(Base):
@@ -36,11 +48,25 @@ class Page(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     section_id = Column(Integer, ForeignKey("draft.sections.id"), nullable=False)
+    # The section's site, copied onto the row: the partition key (see schema.sql section 13)
+    site_id = Column(Integer, nullable=False)
     name = Column(String, unique=True, index=True)
     title = Column(String, nullable=False)
     primary_image = Column(String, nullable=True)
     abstract = Column(Text)
-    content = Column(Text)
+    # Page body: stored lz4-compressed out of line (see schema.sql) and only loaded where a
+    # response includes it (undefer(Page.content)), so other queries read a narrow row
+    content = deferred(Column(Text))
+    sort_order = Column(Integer, default=0)
+    # Generated by the database from title/abstract/content (see schema.sql); never loaded by default
+    search_vector = deferred(Column(TSVECTOR))
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    section = relationship("Section", back_populates="pages")
+    refs = relationship("Ref", back_populates="page", order_by="Ref.id",
+                        cascade="all, delete-orphan", passive_deletes=True)
+    notes = relationship("Note", back_populates="page", order_by="Note.id",
+                         cascade="all, delete-orphan", passive_deletes=True)
 
 # Published Site Model
 class PublishedSite(Base):
@@ -58,6 +84,7 @@ class PublishedPage(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     section_id = Column(Integer, ForeignKey("published.sections.id"), nullable=False)
+    site_id = Column(Integer, nullable=False)
     name = Column(String, unique=True, index=True)
     title = Column(String, nullable=False)
     abstract = Column(Text)
@@ -70,9 +97,14 @@ class Ref(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     page_id = Column(Integer, ForeignKey("draft.pages.id"), nullable=False)
+    site_id = Column(Integer, nullable=False)  # the page's site (partition key)
     url = Column(String, index=True)
     description = Column(String, nullable=False)
     type = Column(String, nullable=False)
+    sort_order = Column(Integer, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    page = relationship("Page", back_populates="refs")
 
 # Define Note Table in Draft Schema
 class Note(Base):
@@ -81,4 +113,43 @@ class Note(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     page_id = Column(Integer, ForeignKey("draft.pages.id"), nullable=False)
+    site_id = Column(Integer, nullable=False)  # the page's site (partition key)
     note = Column(Text)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    page = relationship("Page", back_populates="notes")
+
+# Publishing request / job in the Workflow Schema (queued and run by app.publish_queue)
+class PublishingRequest(Base):
+    __tablename__ = "publishing_requests"
+    __table_args__ = {"schema": "workflow"}
+
+    id = Column(Integer, primary_key=True, index=True)
+    site_id = Column(Integer, ForeignKey("draft.sites.id"), nullable=False)
+    requested_by = Column(Integer, nullable=True)
+    status = Column(String, nullable=False, default="pending")
+    incremental = Column(Boolean, nullable=False, default=False)
+    snapshot = Column(Boolean, nullable=False, default=False)
+    blue_green = Column(Boolean, nullable=False, default=False)
+    progress = Column(Text, nullable=True)  # JSON: per-table row counts
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    reviewed_by = Column(Integer, nullable=True)
+    reviewed_at = Column(DateTime, nullable=True)
+
+# Change feed event in the Workflow Schema (written by database triggers, see schema.sql;
+# streamed by app.change_feed)
+class ChangeEvent(Base):
+    __tablename__ = "change_events"
+    __table_args__ = {"schema": "workflow"}
+
+    id = Column(BigInteger, primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=True)
+    site = Column(String, nullable=True)
+    action = Column(String, nullable=False)
+    version = Column(DateTime, nullable=True)
+    row_count = Column(Integer, nullable=False, server_default="1")
+    created_at = Column(DateTime, server_default=func.now())
@@ -0,0 +1,31 @@
+from sqlalchemy import text
+from app.database import env_flag
+
+# Pages, refs and notes partitioned by site (scripts/database/partition_by_site.sql): every site
+# has its own partition of each, named {table}_site_{site_id}, in both schemas. Set
+# SITE_PARTITIONS=true once the script has run; delete_site then drops whole partitions. Reads
+# need no switch: they filter on site_id either way, so partitions are pruned.
+SITE_PARTITIONS = env_flag("SITE_PARTITIONS")
+# With SITE_PARTITIONS, full publishes empty the site's published partitions with TRUNCATE instead
+# of deleting stale rows. Opt-in: TRUNCATE locks the partitions against all readers until commit.
+SITE_PARTITION_TRUNCATE = env_flag("SITE_PARTITION_TRUNCATE")
+
+# Tables partitioned by site_id, parents first
+PARTITIONED_TABLES = ["pages", "refs", "notes"]
+
+
+def partition_name(table: str, site_id: int) -> str:
+    return f"{table}_site_{int(site_id)}"
+
+# Create a site's partitions if they are missing (e.g. a site created during a blue/green build)
+def create_partitions_statement():
+    return text("SELECT workflow.create_site_partitions(:site_id)")
+
+# Detach and drop a site's draft partitions; returns false if it has none
+def drop_partitions_statement():
+    return text("SELECT workflow.drop_site_partitions(:site_id)")
+
+# Empty a site's published partitions in one statement, for a full republish
+def truncate_statement(site_id: int):
+    tables = ", ".join(f"published.{partition_name(table, site_id)}" for table in PARTITIONED_TABLES)
+    return text(f"TRUNCATE {tables}")
@@ -0,0 +1,70 @@
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import time
+
+
+class PoolStats:
+    """Counters for how long requests waited to get a connection out of a pool."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.checkouts += 1
+        self.total_wait += wait
+        self.last_wait = wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self):
+        attempts = self.checkouts + self.timeouts
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.total_wait, 6),
+            "wait_seconds_avg": round(self.total_wait / attempts, 6) if attempts else 0.0,
+            "wait_seconds_max": round(self.max_wait, 6),
+            "wait_seconds_last": round(self.last_wait, 6),
+        }
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """The default asyncio queue pool, timing every connection checkout (including waits for a free slot)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+
+# Current state of an engine's pool for the internal pool endpoint
+def pool_status(engine):
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    if isinstance(pool, TimedAsyncQueuePool):
+        status.update(pool.stats.as_dict())
+    return status
@@ -0,0 +1,153 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.future import select
+from app.database import PUBLISH_WORKERS, PublishSessionLocal
+from app.models import Site, PublishingRequest
+from app.crud import publish_site
+import asyncio
+import json
+import os
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+# Jobs still 'running' this long after they started are taken to be left over from a process
+# that died, and are run again on start. Keep it above the longest publish.
+PUBLISH_STALE_SECONDS = int(os.getenv("PUBLISH_STALE_SECONDS", "3600"))
+
+
+class PublishQueue:
+    """
+    Runs queued publish jobs (rows of workflow.publishing_requests) on background asyncio tasks.
+
+    Jobs are claimed by flipping their status from 'pending' to 'running', so a job is
+    only run once even when several API processes share the table. Publishes of the same
+    site are serialized by a per-site lock here and by an advisory lock in publish_site.
+    """
+
+    def __init__(self, session_factory, workers: int = 2):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.queue = asyncio.Queue()
+        self.site_locks = {}  # site name -> [lock, jobs holding or waiting for it]
+        self.tasks = []
+
+    async def start(self):
+        # Pick up jobs left pending by a previous run, and those it left running
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(PublishingRequest)
+                .where(PublishingRequest.status == "running",
+                       PublishingRequest.started_at < datetime.utcnow() - timedelta(seconds=PUBLISH_STALE_SECONDS))
+                .values(status="pending", started_at=None)
+                .returning(PublishingRequest.id)
+            )
+            stale = result.scalars().all()
+            await db.commit()
+            if stale:
+                logger.warning("Requeued stale running publish jobs: %s", stale)
+            result = await db.execute(
+                select(PublishingRequest.id)
+                .where(PublishingRequest.status == "pending")
+                .order_by(PublishingRequest.id)
+            )
+            for job_id in result.scalars().all():
+                self.enqueue(job_id)
+
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info("Publish queue started with %s workers", self.workers)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def enqueue(self, job_id: int):
+        self.queue.put_nowait(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Publish job %s crashed", job_id)
+            finally:
+                self.queue.task_done()
+
+    # Serialize jobs of one site; the lock is dropped once no job holds or waits for it
+    @asynccontextmanager
+    async def _site_lock(self, site_name: str):
+        entry = self.site_locks.setdefault(site_name, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.site_locks[site_name]
+
+    async def _update_job(self, job_id: int, **values):
+        async with self.session_factory() as db:
+            await db.execute(update(PublishingRequest).where(PublishingRequest.id == job_id).values(**values))
+            await db.commit()
+
+    async def _claim(self, job_id: int):
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(PublishingRequest)
+                .where(PublishingRequest.id == job_id, PublishingRequest.status == "pending")
+                .values(status="running", started_at=datetime.utcnow())
+                .returning(PublishingRequest.site_id, PublishingRequest.incremental, PublishingRequest.snapshot,
+                           PublishingRequest.blue_green)
+            )
+            claimed = result.first()
+            await db.commit()
+            if not claimed:
+                return None
+            site = await db.execute(select(Site.name).where(Site.id == claimed.site_id))
+            return site.scalar_one_or_none(), claimed.incremental, claimed.snapshot, claimed.blue_green
+
+    async def _run(self, job_id: int):
+        claimed = await self._claim(job_id)
+        if not claimed:
+            logger.info("Publish job %s already claimed, skipping", job_id)
+            return
+        site_name, incremental, snapshot, blue_green = claimed
+        if not site_name:
+            await self._update_job(job_id, status="failed", error="Site not found", finished_at=datetime.utcnow())
+            return
+
+        progress = {}
+
+        async def report(table, stats):
+            progress[table] = dict(stats)
+            await self._update_job(job_id, progress=json.dumps(progress))
+
+        async with self._site_lock(site_name):
+            logger.info("Publish job %s running for site: %s", job_id, site_name)
+            async with self.session_factory() as db:
+                try:
+                    stats = await publish_site(db, site_name, incremental=incremental, progress=report,
+                                               snapshot=snapshot, blue_green=blue_green)
+                except Exception as e:
+                    await db.rollback()
+                    logger.exception("Publish job %s failed for site: %s", job_id, site_name)
+                    await self._update_job(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+                    return
+
+        # The site is published even if its snapshot failed; the job records the snapshot error
+        values = {}
+        if "snapshot_error" in stats:
+            progress["snapshot_error"] = stats["snapshot_error"]
+            values["progress"] = json.dumps(progress)
+        await self._update_job(job_id, status="completed", finished_at=datetime.utcnow(), **values)
+        logger.info("Publish job %s completed for site: %s", job_id, site_name)
+
+
+# Shared queue, started and stopped with the application (see app.main)
+publish_queue = PublishQueue(PublishSessionLocal, workers=PUBLISH_WORKERS)
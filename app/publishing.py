@@ -0,0 +1,74 @@
+from sqlalchemy import text
+from app.partitions import SITE_PARTITIONS, PARTITIONED_TABLES
+
+# SQL used by crud.publish_site to copy a site from the draft schema to the published schema.
+#
+# Every table is listed parent-first with the columns that are published and a
+# predicate that restricts it to the rows of one site (`:site_name`, whose id is `:site_id`).
+
+PUBLISH_TABLES = [
+    ("sites", ["id", "name", "title", "url", "logo"]),
+    ("sections", ["id", "site_id", "name", "title", "sort_order"]),
+    ("pages", ["id", "section_id", "site_id", "name", "title", "primary_image", "abstract", "content", "sort_order"]),
+    ("refs", ["id", "page_id", "site_id", "url", "description", "type", "sort_order"]),
+    ("notes", ["id", "page_id", "site_id", "note"]),
+]
+
+# Rows of a table that belong to the site, written against the given schema.
+# Other tables compare site_id with the bound id, so the planner only reads the site's partitions.
+def site_scope(schema: str, table: str) -> str:
+    if table == "sites":
+        return f"{schema}.sites.name = :site_name"
+    return f"{schema}.{table}.site_id = :site_id"
+
+# Copy the site's rows of a table into the published schema.
+# When incremental, rows identical to their published copy are skipped (EXCEPT compares whole rows),
+# so only new and changed rows are written.
+def upsert_statement(table: str, columns: list, incremental: bool = False):
+    column_list = ", ".join(columns)
+    draft_rows = f"SELECT {column_list} FROM draft.{table} WHERE {site_scope('draft', table)}"
+    if incremental:
+        published_rows = f"SELECT {column_list} FROM published.{table} WHERE {site_scope('published', table)}"
+        draft_rows = f"SELECT * FROM ({draft_rows} EXCEPT {published_rows}) AS changed"
+    # Partitioned tables are unique on (site_id, id) only
+    key = ["site_id", "id"] if SITE_PARTITIONS and table in PARTITIONED_TABLES else ["id"]
+    updates = ", ".join(f"{column}=EXCLUDED.{column}" for column in columns if column not in key)
+    return text(f"""
+        INSERT INTO published.{table} ({column_list})
+        {draft_rows}
+        ON CONFLICT ({", ".join(key)}) DO UPDATE SET {updates}
+    """)
+
+# Remove the site's published rows of a table that no longer exist in draft
+def delete_statement(table: str):
+    return text(f"""
+        DELETE FROM published.{table}
+        WHERE {site_scope('published', table)}
+          AND id NOT IN (SELECT id FROM draft.{table} WHERE {site_scope('draft', table)})
+    """)
+
+# Serialize publishes of the same site across processes (released at commit/rollback)
+def lock_statement():
+    return text("SELECT pg_advisory_xact_lock(hashtext(:site_name))")
+
+# Audit entry in workflow.publishing_log; details carry the mode and row counts
+def log_statement():
+    return text("""
+        INSERT INTO workflow.publishing_log (site_id, action, details)
+        SELECT id, :action, :details FROM draft.sites WHERE name = :site_name
+    """)
+
+# Publishes take this lock shared so they can run side by side; blue/green publishes and
+# rollbacks, which replace the whole published schema, take it exclusively (as do full
+# publishes that truncate partitions, see crud.publish_site)
+def generation_lock_statement(shared: bool = False):
+    function = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    return text(f"SELECT {function}(hashtext('guten:published'))")
+
+# Rebuild the published navigation view (see schema.sql); CONCURRENTLY keeps it readable meanwhile
+def refresh_nav_statement():
+    return text("REFRESH MATERIALIZED VIEW CONCURRENTLY published.site_nav")
+
+# A site's navigation as ready-made JSON text: one lookup on the view's unique index
+def nav_statement():
+    return text("SELECT nav::text FROM published.site_nav WHERE site_name = :site_name")
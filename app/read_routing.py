@@ -0,0 +1,38 @@
+from starlette.datastructures import Headers
+from app.database import PRIMARY_PIN_COOKIE, REPLICA_PIN_SECONDS, pin_key, pin_to_primary
+import time
+
+# Methods that never write; everything else pins the client to the primary
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware that pins a client to the primary database for REPLICA_PIN_SECONDS
+    after a successful write, so its next reads don't hit a replica that hasn't caught up.
+
+    The pin is a short-lived cookie that every worker honours (see database.get_read_db).
+    For clients that don't keep cookies, it is also recorded in this worker under the
+    REPLICA_PIN_HEADER value set by a trusted proxy, if configured. The client address is
+    not used: clients behind one NAT or proxy would pin each other.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                client_key = pin_key(Headers(scope=scope))
+                if client_key:
+                    pin_to_primary(client_key)
+                cookie = (f"{PRIMARY_PIN_COOKIE}={time.time() + REPLICA_PIN_SECONDS:.3f}; "
+                          f"Max-Age={int(REPLICA_PIN_SECONDS) + 1}; Path=/; HttpOnly; SameSite=Lax")
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
@@ -0,0 +1,30 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.models import Site, Section
+
+# Resolve site/section names to ids, for error messages and the few statements that need the
+# id up front. Reads and writes otherwise resolve names inside the statement (the *_subquery
+# helpers below).
+
+async def resolve_site_id(db: AsyncSession, site_name: str):
+    result = await db.execute(select(Site.id).where(Site.name == site_name))
+    return result.scalar_one_or_none()
+
+async def resolve_section_id(db: AsyncSession, site_id: int, section_name: str):
+    result = await db.execute(
+        select(Section.id).where(Section.site_id == site_id, Section.name == section_name)
+    )
+    return result.scalar_one_or_none()
+
+# Site lookup as a scalar subquery, matched with the site_id of pages, refs and notes inside the
+# statement itself (partitions are then pruned at execution time)
+def site_id_subquery(site_name: str):
+    return select(Site.id).where(Site.name == site_name).scalar_subquery()
+
+# Section lookup as a scalar subquery, for writes that resolve it inside the statement itself
+def section_id_subquery(site_name: str, section_name: str):
+    return (
+        select(Section.id).join(Site)
+        .where(Site.name == site_name, Section.name == section_name)
+        .scalar_subquery()
+    )
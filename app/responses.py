@@ -0,0 +1,72 @@
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+import json
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:  # orjson is optional; responses then use the stdlib json encoder
+    orjson = None
+    ORJSONResponse = None
+
+# Response class for the app and for trusted_response
+FastJSONResponse = ORJSONResponse if orjson else JSONResponse
+
+# Headers of the injected Response that must not be copied onto the real one
+SKIP_HEADERS = {"content-length", "content-type"}
+
+
+# Plain dict of a response model's fields, read straight from an ORM row (or a response
+# model instance) without validating it again
+def dump_trusted(model: type[BaseModel], obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    return {name: getattr(obj, name, field.default) for name, field in model.model_fields.items()}
+
+
+def trusted_response(model: type[BaseModel], content, response: Response = None, status_code: int = 200):
+    """
+    Serialize rows we loaded ourselves (ORM objects or already-built response models)
+    straight to JSON with the fast response class.
+
+    Returning a Response skips FastAPI's response_model validation and serialization,
+    which would otherwise validate every row from attributes and encode it a second time.
+    The route keeps its response_model for the OpenAPI docs. Headers set on the injected
+    `response` (ETag, X-Next-Cursor, ...) are carried over.
+    """
+    if isinstance(content, (list, tuple)):
+        data = [dump_trusted(model, obj) for obj in content]
+    else:
+        data = dump_trusted(model, content)
+    if orjson is None:
+        data = jsonable_encoder(data)
+
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key not in SKIP_HEADERS}
+    return FastJSONResponse(content=data, status_code=status_code, headers=headers)
+
+
+# One NDJSON chunk (a line per row) for a batch of trusted rows
+def ndjson_chunk(model: type[BaseModel], rows) -> bytes:
+    if orjson is None:
+        return "".join(json.dumps(jsonable_encoder(dump_trusted(model, row))) + "\n" for row in rows).encode()
+    return b"".join(orjson.dumps(dump_trusted(model, row)) + b"\n" for row in rows)
+
+
+def ndjson_response(model: type[BaseModel], batches, response: Response = None):
+    """
+    Stream an async iterator of row batches (see crud.stream_rows) as NDJSON, one chunk
+    per batch, so only one batch is ever held in memory. Like trusted_response, the rows
+    are not validated again, and headers set on the injected `response` are carried over.
+    """
+    async def body():
+        async for rows in batches:
+            yield ndjson_chunk(model, rows)
+
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key not in SKIP_HEADERS}
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers=headers)
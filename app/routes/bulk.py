@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app.bulk_import import import_ndjson, iter_lines, BULK_BATCH_SIZE
+from app.batch import batch_update, batch_reorder, batch_delete, batch_move_pages
+from app.schemas import (
+    PageBatchUpdateRequest, SectionBatchUpdateRequest, RefBatchUpdateRequest,
+    BatchReorderRequest, BatchDeleteRequest, BatchMoveRequest, BatchResponse,
+)
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Bulk import pages, refs and notes from a streamed NDJSON body (one record per line)
+@router.post("/bulk/import")
+async def bulk_import(request: Request, batch_size: int = BULK_BATCH_SIZE, db: AsyncSession = Depends(get_db)):
+    logger.info("bulk_import called with batch size: %s", batch_size)
+    summary = await import_ndjson(db, iter_lines(request.stream()), batch_size)
+    logger.info("bulk_import finished: %s, %s errors", summary['inserted'], len(summary['errors']))
+    return summary
+
+# Batch update pages (each item changes only the fields it sets)
+@router.post("/batch/pages/update", response_model=BatchResponse)
+async def batch_update_pages(batch: PageBatchUpdateRequest, db: AsyncSession = Depends(get_db)):
+    logger.info("batch_update_pages called with %s items", len(batch.items))
+    return await batch_update(db, "pages", [item.model_dump(exclude_unset=True) for item in batch.items])
+
+# Batch update sections
+@router.post("/batch/sections/update", response_model=BatchResponse)
+async def batch_update_sections(batch: SectionBatchUpdateRequest, db: AsyncSession = Depends(get_db)):
+    logger.info("batch_update_sections called with %s items", len(batch.items))
+    return await batch_update(db, "sections", [item.model_dump(exclude_unset=True) for item in batch.items])
+
+# Batch update refs
+@router.post("/batch/refs/update", response_model=BatchResponse)
+async def batch_update_refs(batch: RefBatchUpdateRequest, db: AsyncSession = Depends(get_db)):
+    logger.info("batch_update_refs called with %s items", len(batch.items))
+    return await batch_update(db, "refs", [item.model_dump(exclude_unset=True) for item in batch.items])
+
+# Move pages into another section
+@router.post("/batch/pages/move", response_model=BatchResponse)
+async def batch_move(batch: BatchMoveRequest, db: AsyncSession = Depends(get_db)):
+    logger.info("batch_move called with %s pages to %s/%s", len(batch.page_ids), batch.site_name, batch.section_name)
+    return await batch_move_pages(db, batch.page_ids, batch.site_name, batch.section_name)
+
+# Set the sort order of many pages, sections or refs
+@router.post("/batch/{entity}/reorder", response_model=BatchResponse)
+async def batch_reorder_items(entity: str, batch: BatchReorderRequest, db: AsyncSession = Depends(get_db)):
+    logger.info("batch_reorder called for %s with %s items", entity, len(batch.items))
+    return await batch_reorder(db, entity, [item.model_dump() for item in batch.items])
+
+# Delete many pages, sections or refs
+@router.post("/batch/{entity}/delete", response_model=BatchResponse)
+async def batch_delete_items(entity: str, batch: BatchDeleteRequest, db: AsyncSession = Depends(get_db)):
+    logger.info("batch_delete called for %s with %s ids", entity, len(batch.ids))
+    return await batch_delete(db, entity, batch.ids)
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.change_feed import change_feed
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Stream change events (Server-Sent Events) for all sites, or one with ?site=.
+# Reconnecting clients send Last-Event-ID (or ?last_event_id=) to resume where they left off.
+@router.get("/changes")
+async def stream_changes(site: Optional[str] = None, last_event_id: Optional[int] = Query(None),
+                         last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")):
+    if not change_feed.available:
+        raise HTTPException(status_code=503, detail="Change feed is disabled")
+    if last_event_id is None and last_event_id_header:
+        try:
+            last_event_id = int(last_event_id_header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    logger.info("stream_changes called with site: %s, last_event_id: %s", site, last_event_id)
+    return StreamingResponse(
+        change_feed.stream(site, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from app.database import engine, publish_engine, replica_engines
+from app.pool import pool_status
+
+router = APIRouter()
+
+# Connection pool state: checked-out connections, overflow and checkout wait times
+@router.get("/_internal/pool")
+async def read_pool_status():
+    return {
+        "api": pool_status(engine),
+        "publish": pool_status(publish_engine),
+        "replicas": [pool_status(replica) for replica in replica_engines],
+    }
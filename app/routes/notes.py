@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_db, get_read_db, get_read_session_factory
+from app.conditional import check_not_modified, has_validator, set_validators
+from app.responses import trusted_response, ndjson_response
 from app.crud import (
+    get_version, notes_by_page_query, stream_rows,
     get_notes_by_page, create_note, delete_note
     # , get_ref_details, create_ref,
     # update_ref, delete_ref
@@ -16,14 +19,24 @@ router = APIRouter()
 
 
 @router.get("/notes", response_model=list[NoteResponse])
-async def read_notes(site: str, section: str, page: str, db: AsyncSession = Depends(get_db)):
-    logger.info(f"@@@@@@@@@@@@@@ read_notes called with site: {site}, section: {section}, page: {page}")
-    return await get_notes_by_page(db, site, section, page)
+async def read_notes(site: str, section: str, page: str, request: Request, response: Response,
+                     stream: bool = False, db: AsyncSession = Depends(get_read_db),
+                     session_factory=Depends(get_read_session_factory)):
+    logger.info("@@@@@@@@@@@@@@ read_notes called with site: %s, section: %s, page: %s", site, section, page)
+    query = notes_by_page_query(site, section, page)
+    if has_validator(request):
+        check_not_modified(request, response, await get_version(db, query))
+    if stream:
+        notes = stream_rows(session_factory, query)
+        return ndjson_response(NoteResponse, notes, response)
+    notes = await get_notes_by_page(db, site, section, page)
+    set_validators(request, response, notes)
+    return trusted_response(NoteResponse, notes, response)
 
 # Create a new note
 @router.post("/notes", response_model=NoteResponse)
 async def create_new_note(note: NoteCreate, db: AsyncSession = Depends(get_db)):
-    logger.info(f"@@@@@@@@@@@@@@ create_new_note called with {note}")
+    logger.info("@@@@@@@@@@@@@@ create_new_note called with %s", note)
     return await create_note(db, note)
 
 # Delete a note
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_db, get_read_db, get_read_session_factory
 from app.crud import (
     get_pages_by_section, get_page_details, get_page_details_by_id, get_pages_by_site, create_page,
-    update_page, delete_page
+    update_page, update_page_by_id, delete_page,
+    get_version, pages_by_section_query, pages_by_site_query, stream_pages
 )
+from app.conditional import check_not_modified, has_validator, rows_version, set_validators
+from app.responses import trusted_response, ndjson_response
 from app.schemas import PageCreate, PageResponse, PageCreateResponse
 import logging
 
@@ -13,6 +17,21 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Largest batch a client may request from the paginated listing endpoints
+MAX_PAGE_LIMIT = 1000
+
+# Tell the client where the next batch starts (only when this batch was full).
+# With ?stream=true the listings send every matching page as NDJSON instead (no cursor header).
+def set_next_cursor(response: Response, pages: list, limit: Optional[int]):
+    if limit is not None and len(pages) == limit:
+        response.headers["X-Next-Cursor"] = str(pages[-1].id)
+
+# Whether a listing returns every page with every column. Only those get ETags: the version
+# query covers the whole collection, so checking it would cost a page of a paginated or summary
+# listing an extra aggregate over all of its pages.
+def full_listing(after: Optional[int], limit: Optional[int], summary: bool) -> bool:
+    return after is None and limit is None and not summary
+
 # @router.get("/pages")
 # async def read_pages(section: str, db: AsyncSession = Depends(get_db)):
 #     return await get_pages_by_section(db, section)
@@ -28,9 +47,22 @@ router = APIRouter()
 @router.get("/pages", response_model=list[PageResponse])
 # async def read_pages(section: str, db: AsyncSession = Depends(get_db)):
 #     return await get_pages_by_section(db, section)
-async def read_pages(site: str, section: str, db: AsyncSession = Depends(get_db)):
-    logger.info(f"@@@@@@@@@@@@@@ read_pages called with site: {site}, section: {section}")
-    return await get_pages_by_section(db, site, section)
+async def read_pages(request: Request, response: Response, site: str, section: str,
+                     after: Optional[int] = None, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+                     summary: bool = False, stream: bool = False, db: AsyncSession = Depends(get_read_db),
+                     session_factory=Depends(get_read_session_factory)):
+    logger.info("@@@@@@@@@@@@@@ read_pages called with site: %s, section: %s", site, section)
+    query = pages_by_section_query(site, section)
+    if has_validator(request) and full_listing(after, limit, summary):
+        check_not_modified(request, response, await get_version(db, query))
+    if stream:
+        pages = stream_pages(session_factory, query, after, limit, summary)
+        return ndjson_response(PageResponse, pages, response)
+    pages = await get_pages_by_section(db, site, section, after=after, limit=limit, summary=summary)
+    set_next_cursor(response, pages, limit)
+    if full_listing(after, limit, summary):
+        set_validators(request, response, pages)
+    return trusted_response(PageResponse, pages, response)
 
 # @router.get("/pages/{page_name}", response_model=PageResponse)
 # async def read_page(page_name: str, section: str, db: AsyncSession = Depends(get_db)):
@@ -39,33 +71,49 @@ async def read_pages(site: str, section: str, db: AsyncSession = Depends(get_db)
 #         raise HTTPException(status_code=404, detail="Page not found")
 #     return page
 @router.get("/pages/{page_name}", response_model=PageResponse)
-async def read_page(page_name: str, site: str, section: str, db: AsyncSession = Depends(get_db)):
-    logger.info(f"&&&&&&&&&&& read_page called with site: {site}, section: {section}")
+async def read_page(page_name: str, site: str, section: str, request: Request, response: Response,
+                    db: AsyncSession = Depends(get_read_db)):
+    logger.info("&&&&&&&&&&& read_page called with site: %s, section: %s", site, section)
     page = await get_page_details(db, site, section, page_name)
-    logger.info(f"&&&&&&&&&&& Returning with page details: {page.name} {page.primary_image}")
+    logger.info("&&&&&&&&&&& Returning with page details: %s %s", page.name, page.primary_image)
     if not page:
         raise HTTPException(status_code=404, detail="Page not found")
-    return page
+    check_not_modified(request, response, rows_version([page]), single_row=True)
+    return trusted_response(PageResponse, page, response)
 
 # Get all pages for the given site
 @router.get("/pages_all/{site_name}", response_model=list[PageResponse])
-async def read_all_pages(site_name: str, db: AsyncSession = Depends(get_db)):
-    logger.info(f"read_all_pages called with site: {site_name}")
-    return await get_pages_by_site(db, site_name)
+async def read_all_pages(request: Request, response: Response, site_name: str,
+                         after: Optional[int] = None, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+                         summary: bool = False, stream: bool = False, db: AsyncSession = Depends(get_read_db),
+                         session_factory=Depends(get_read_session_factory)):
+    logger.info("read_all_pages called with site: %s", site_name)
+    query = pages_by_site_query(site_name)
+    if has_validator(request) and full_listing(after, limit, summary):
+        check_not_modified(request, response, await get_version(db, query))
+    if stream:
+        pages = stream_pages(session_factory, query, after, limit, summary)
+        return ndjson_response(PageResponse, pages, response)
+    pages = await get_pages_by_site(db, site_name, after=after, limit=limit, summary=summary)
+    set_next_cursor(response, pages, limit)
+    if full_listing(after, limit, summary):
+        set_validators(request, response, pages)
+    return trusted_response(PageResponse, pages, response)
 
 # Get page by ID
 @router.get("/page_by_id/{page_id}", response_model=PageResponse)
-async def read_page_by_id(page_id: int, db: AsyncSession = Depends(get_db)):
-    logger.info(f"read_page_by_id called with ID: {page_id}")
+async def read_page_by_id(page_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
+    logger.info("read_page_by_id called with ID: %s", page_id)
     page = await get_page_details_by_id(db, page_id)
     if not page:
         raise HTTPException(status_code=404, detail="Page not found")
-    return page
+    check_not_modified(request, response, rows_version([page]), single_row=True)
+    return trusted_response(PageResponse, page, response)
 
 # Create a new page
 @router.post("/pages", response_model=PageCreateResponse)
 async def create_new_page(page: PageCreate, db: AsyncSession = Depends(get_db)):
-    logger.info(f"create_new_page called with {page}")
+    logger.info("create_new_page called with %s", page)
     return await create_page(db, page)
 
 @router.put("/pages/{page_name}", response_model=PageResponse)
@@ -74,7 +122,7 @@ async def update_existing_page(page_name: str, page: PageCreate, db: AsyncSessio
 
 @router.put("/page_by_id/{page_id}", response_model=PageResponse)
 async def update_existing_page_by_id(page_id: int, page: PageCreate, db: AsyncSession = Depends(get_db)):
-    return await update_page(db, page_id, page)
+    return await update_page_by_id(db, page_id, page)
 
 @router.delete("/pages/{page_id}")
 async def remove_page(page_id: int, db: AsyncSession = Depends(get_db)):
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
-from app.crud import publish_site, get_published_page
-from app.schemas import PageResponse
+from app.database import get_db, get_read_db
+from app.crud import create_publish_job, get_publish_job, get_published_page, get_published_nav, rollback_published_site
+from app.publish_queue import publish_queue
+from app.responses import trusted_response
+from app.schemas import PageResponse, PublishJobResponse, SiteNavResponse
+import json
 import logging
 
 # Logger for this file
@@ -10,15 +13,57 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.post("/publish/{site_name}")
-async def publish_site_route(site_name: str, db: AsyncSession = Depends(get_db)):
-    logger.info(f"^^^^^^^^^^^^^^^ publish_site_route called for site: {site_name}")
-    await publish_site(db, site_name)
-    return {"message": f"Site '{site_name}' successfully published."}
+# Queue a publish of the site; poll /publish/jobs/{job_id} for its progress
+@router.post("/publish/{site_name}", status_code=202)
+async def publish_site_route(site_name: str, incremental: bool = False, snapshot: bool = False,
+                             blue_green: bool = False, db: AsyncSession = Depends(get_db)):
+    logger.info("^^^^^^^^^^^^^^^ publish_site_route called for site: %s", site_name)
+    job = await create_publish_job(db, site_name, incremental=incremental, snapshot=snapshot, blue_green=blue_green)
+    publish_queue.enqueue(job.id)
+    return {"message": f"Publish of site '{site_name}' queued.", "job_id": job.id, "status": job.status}
 
+# Status and per-table progress of a publish job
+@router.get("/publish/jobs/{job_id}", response_model=PublishJobResponse)
+async def get_publish_job_route(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await get_publish_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Publish job not found")
+    return PublishJobResponse(
+        id=job.id,
+        site_id=job.site_id,
+        status=job.status,
+        incremental=job.incremental,
+        snapshot=job.snapshot,
+        blue_green=job.blue_green,
+        progress=json.loads(job.progress) if job.progress else None,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at
+    )
+
+# Swap the published generation from before the latest blue/green publish of the site back in
+@router.post("/publish/{site_name}/rollback")
+async def rollback_publish_route(site_name: str, snapshot: bool = False, db: AsyncSession = Depends(get_db)):
+    logger.info("rollback_publish_route called for site: %s", site_name)
+    stats = await rollback_published_site(db, site_name, snapshot=snapshot)
+    response = {"message": f"Published site '{site_name}' rolled back to its previous generation."}
+    if "snapshot_error" in stats:
+        response["snapshot_error"] = stats["snapshot_error"]
+    return response
+
+# Cache hits don't touch the database; misses read from a replica (see crud.get_published_page)
 @router.get("/published/pages/{page_name}", response_model=PageResponse)
-async def get_published_page_route(page_name: str, site: str, db: AsyncSession = Depends(get_db)):
+async def get_published_page_route(page_name: str, site: str, db: AsyncSession = Depends(get_read_db)):
     page = await get_published_page(db, site, page_name)
     if not page:
         raise HTTPException(status_code=404, detail="Published page not found")
-    return page
+    return trusted_response(PageResponse, page)
+
+# Sections and page titles of a published site, served as stored in the site_nav view
+@router.get("/published/nav/{site_name}", response_model=SiteNavResponse)
+async def get_published_nav_route(site_name: str, db: AsyncSession = Depends(get_read_db)):
+    nav = await get_published_nav(db, site_name)
+    if nav is None:
+        raise HTTPException(status_code=404, detail="Published site not found")
+    return Response(content=nav, media_type="application/json")
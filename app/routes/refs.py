@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_db, get_read_db, get_read_session_factory
+from app.conditional import check_not_modified, has_validator, set_validators
+from app.responses import trusted_response, ndjson_response
 from app.crud import (
+    get_version, refs_by_page_query, stream_rows,
     get_refs_by_page, create_ref, update_ref, delete_ref
     # , get_ref_details, create_ref,
     # update_ref, delete_ref
@@ -16,20 +19,30 @@ router = APIRouter()
 
 # Get all references for a page
 @router.get("/refs", response_model=list[RefResponse])
-async def read_refs(site: str, section: str, page: str, db: AsyncSession = Depends(get_db)):
-    logger.info(f"@@@@@@@@@@@@@@ read_refs called with site: {site}, section: {section}, page: {page}")
-    return await get_refs_by_page(db, site, section, page)
+async def read_refs(site: str, section: str, page: str, request: Request, response: Response,
+                     stream: bool = False, db: AsyncSession = Depends(get_read_db),
+                     session_factory=Depends(get_read_session_factory)):
+    logger.info("@@@@@@@@@@@@@@ read_refs called with site: %s, section: %s, page: %s", site, section, page)
+    query = refs_by_page_query(site, section, page)
+    if has_validator(request):
+        check_not_modified(request, response, await get_version(db, query))
+    if stream:
+        refs = stream_rows(session_factory, query)
+        return ndjson_response(RefResponse, refs, response)
+    refs = await get_refs_by_page(db, site, section, page)
+    set_validators(request, response, refs)
+    return trusted_response(RefResponse, refs, response)
 
 # Create a new ref
 @router.post("/refs", response_model=RefResponse)
 async def create_new_ref(ref: RefCreate, db: AsyncSession = Depends(get_db)):
-    logger.info(f"@@@@@@@@@@@@@@ create_new_ref called with {ref}")
+    logger.info("@@@@@@@@@@@@@@ create_new_ref called with %s", ref)
     return await create_ref(db, ref)
 
 # Update a ref
 @router.put("/refs/{ref_id}", response_model=RefResponse)
 async def update_existing_ref(ref_id: int, ref: RefUpdate, db: AsyncSession = Depends(get_db)):
-    logger.info(f"update_existing_ref called with ref id: {ref_id}")
+    logger.info("update_existing_ref called with ref id: %s", ref_id)
     return await update_ref(db, ref_id, ref)
 
 @router.delete("/refs/{ref_id}")
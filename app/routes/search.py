@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_read_db
+from app.crud import search_pages
+from app.responses import trusted_response
+from app.schemas import SearchHit
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Search the pages of a site (draft by default, published=true for the published copy)
+@router.get("/search", response_model=list[SearchHit])
+async def search(site: str, q: str = Query(..., min_length=1),
+                 limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0),
+                 published: bool = False, db: AsyncSession = Depends(get_read_db)):
+    logger.info("search called with site: %s, q: %s", site, q)
+    return trusted_response(SearchHit, await search_pages(db, site, q, limit=limit, offset=offset, published=published))
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.crud import (
     get_sections_by_site, get_section_details, get_section_details_by_id,
-    create_section, update_section, delete_section
+    create_section, update_section, delete_section,
+    get_version, sections_by_site_query
 )
+from app.conditional import check_not_modified, has_validator, rows_version, set_validators
+from app.responses import trusted_response
 from app.schemas import SectionCreate, SectionUpdate, SectionResponse
 import logging
 
@@ -14,34 +17,42 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.get("/sections", response_model=list[SectionResponse])
-async def get_sections(site: str, db: AsyncSession = Depends(get_db)):
-    return await get_sections_by_site(db, site)
+async def get_sections(site: str, request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
+    if has_validator(request):
+        check_not_modified(request, response, await get_version(db, sections_by_site_query(site)))
+    sections = await get_sections_by_site(db, site)
+    set_validators(request, response, sections)
+    return trusted_response(SectionResponse, sections, response)
 
 @router.get("/sections/{section_name}", response_model=SectionResponse)
-async def section_detail(section_name: str, site: str, db: AsyncSession = Depends(get_db)):
+async def section_detail(section_name: str, site: str, request: Request, response: Response,
+                         db: AsyncSession = Depends(get_read_db)):
     section = await get_section_details(db, site, section_name)
     if not section:
         raise HTTPException(status_code=404, detail="Section not found")
-    return section
+    check_not_modified(request, response, rows_version([section]), single_row=True)
+    return trusted_response(SectionResponse, section, response)
 
 # Get a section by its ID only
 @router.get("/section_by_id/{section_id}", response_model=SectionResponse)
-async def section_detail_by_id(section_id: int, db: AsyncSession = Depends(get_db)):
+async def section_detail_by_id(section_id: int, request: Request, response: Response,
+                               db: AsyncSession = Depends(get_read_db)):
     section = await get_section_details_by_id(db, section_id)
     if not section:
         raise HTTPException(status_code=404, detail="Section not found")
-    return section
+    check_not_modified(request, response, rows_version([section]), single_row=True)
+    return trusted_response(SectionResponse, section, response)
 
 # Create a new section 
 @router.post("/sections", response_model=SectionResponse)
 async def create_new_section(section: SectionCreate, db: AsyncSession = Depends(get_db)):
-    logger.info(f"$$$$$$$$$$$ create_new_section called")
+    logger.info("$$$$$$$$$$$ create_new_section called")
     return await create_section(db, section)
 
 # Update a section
 @router.put("/sections/{section_id}", response_model=SectionResponse)
 async def update_existing_section(section_id: int, section: SectionUpdate, db: AsyncSession = Depends(get_db)):
-    logger.info(f"update_existing_section called with section id: {section_id}")
+    logger.info("update_existing_section called with section id: %s", section_id)
     return await update_section(db, section_id, section)
 
 # @router.put("/sites/{site_name}")
@@ -55,6 +66,6 @@ async def update_existing_section(section_id: int, section: SectionUpdate, db: A
 
 @router.delete("/sections/{section_id}")
 async def remove_section(section_id: int, db: AsyncSession = Depends(get_db)):
-    logger.info(f"remove_section called with section id: {section_id}")
+    logger.info("remove_section called with section id: %s", section_id)
     await delete_section(db, section_id)
     return {"message": "Section deleted successfully"}
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_db, get_read_db
 import app.crud as crud
-from app.crud import create_site, get_site_by_name, get_sites
-from app.schemas import SiteCreate, SiteResponse, SiteUpdate
+from app.crud import create_site, get_site_by_name, get_sites, get_site_tree, get_version, sites_query
+from app.conditional import check_not_modified, has_validator, rows_version, set_validators
+from app.responses import trusted_response
+from app.schemas import SiteCreate, SiteResponse, SiteUpdate, SiteTreeResponse
 import logging
 
 # Logger for this file
@@ -21,15 +23,29 @@ router = APIRouter()
 #     return await get_site_by_name(db, site_name)
 
 @router.get("/sites", response_model=list[SiteResponse])
-async def read_sites(db: AsyncSession = Depends(get_db)):
-    return await get_sites(db)
+async def read_sites(request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
+    if has_validator(request):
+        check_not_modified(request, response, await get_version(db, sites_query()))
+    sites = await get_sites(db)
+    set_validators(request, response, sites)
+    return trusted_response(SiteResponse, sites, response)
 
 @router.get("/sites/{site_name}", response_model=SiteResponse)
-async def read_site(site_name: str, db: AsyncSession = Depends(get_db)):
+async def read_site(site_name: str, request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
     site = await get_site_by_name(db, site_name)
     if not site:
         raise HTTPException(status_code=404, detail="Site not found")
-    return site
+    check_not_modified(request, response, rows_version([site]), single_row=True)
+    return trusted_response(SiteResponse, site, response)
+
+# Get a site with its sections and pages (optionally refs and notes) in one call
+@router.get("/sites/{site_name}/tree", response_model=SiteTreeResponse)
+async def read_site_tree(site_name: str, refs: bool = False, notes: bool = False, db: AsyncSession = Depends(get_read_db)):
+    logger.info("read_site_tree called with site: %s, refs: %s, notes: %s", site_name, refs, notes)
+    tree = await get_site_tree(db, site_name, include_refs=refs, include_notes=notes)
+    if not tree:
+        raise HTTPException(status_code=404, detail="Site not found")
+    return trusted_response(SiteTreeResponse, tree)
 
 @router.post("/sites", response_model=SiteResponse)
 async def create_new_site(site: SiteCreate, db: AsyncSession = Depends(get_db)):
@@ -38,9 +54,9 @@ async def create_new_site(site: SiteCreate, db: AsyncSession = Depends(get_db)):
 
 @router.put("/sites/{site_name}")
 async def update_site(site_name: str, site: SiteUpdate, db: AsyncSession = Depends(get_db)):
-    logger.info(f"$$$$$$$$$$$ update_site called with site_name: {site_name}")
+    logger.info("$$$$$$$$$$$ update_site called with site_name: %s", site_name)
     updated_site = await crud.update_site(db, site_name, site)
-    logger.info(f"$$$$$$$$$$$ update_site returned {update_site}")
+    logger.info("$$$$$$$$$$$ update_site returned %s", update_site)
     if not updated_site:
         raise HTTPException(status_code=404, detail="Site not found")
     return updated_site
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+from app.snapshot import resolve_file
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Serve a file of a site's static snapshot (manifest.json, nav.*.json, page-*.json),
+# pre-compressed when the client accepts it. Hashed files never change and may be cached forever.
+@router.get("/snapshot/{site_name}/{filename}")
+async def read_snapshot_file(site_name: str, filename: str, request: Request):
+    try:
+        path, encoding = resolve_file(site_name, filename, request.headers.get("accept-encoding", ""))
+    except ValueError:
+        path, encoding = None, None
+    if not path:
+        raise HTTPException(status_code=404, detail="Snapshot file not found")
+
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if filename == "manifest.json":
+        headers["Cache-Control"] = "no-cache"
+    else:
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return FileResponse(path, media_type="application/json", headers=headers)
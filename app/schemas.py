@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime
 
 # Site Schema
 class SiteBase(BaseModel):
@@ -116,3 +117,107 @@ class NoteResponse(BaseModel):
     id: int
     page_id: int
     note: str
+
+# Site tree Schema (site -> sections -> pages, with optional refs and notes)
+class PageTreeResponse(PageResponse):
+    refs: Optional[list[RefResponse]] = None
+    notes: Optional[list[NoteResponse]] = None
+
+class SectionTreeResponse(SectionResponse):
+    pages: list[PageTreeResponse] = []
+
+class SiteTreeResponse(SiteResponse):
+    sections: list[SectionTreeResponse] = []
+
+# Published navigation Schema (GET /published/nav/{site_name})
+class NavPage(BaseModel):
+    name: str
+    title: str
+
+class NavSection(BaseModel):
+    name: str
+    title: Optional[str] = None
+    pages: list[NavPage] = []
+
+class SiteNavResponse(BaseModel):
+    site_name: str
+    title: str
+    sections: list[NavSection] = []
+
+# Publish job Schema
+class PublishJobResponse(BaseModel):
+    id: int
+    site_id: int
+    status: str
+    incremental: bool
+    snapshot: bool = False
+    blue_green: bool = False
+    progress: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+# Search Schema
+class SearchHit(BaseModel):
+    id: int
+    section_id: int
+    section_name: str
+    name: str
+    title: str
+    rank: float
+    snippet: Optional[str] = None
+
+# Batch mutations (see app/batch.py). Update items only change the fields they set.
+class PageBatchUpdate(BaseModel):
+    id: int
+    name: Optional[str] = None
+    title: Optional[str] = None
+    primary_image: Optional[str] = None
+    abstract: Optional[str] = None
+    content: Optional[str] = None
+
+class SectionBatchUpdate(BaseModel):
+    id: int
+    name: Optional[str] = None
+    title: Optional[str] = None
+    label: Optional[str] = None
+
+class RefBatchUpdate(BaseModel):
+    id: int
+    url: Optional[str] = None
+    description: Optional[str] = None
+    type: Optional[str] = None
+
+class PageBatchUpdateRequest(BaseModel):
+    items: list[PageBatchUpdate]
+
+class SectionBatchUpdateRequest(BaseModel):
+    items: list[SectionBatchUpdate]
+
+class RefBatchUpdateRequest(BaseModel):
+    items: list[RefBatchUpdate]
+
+class BatchReorderItem(BaseModel):
+    id: int
+    sort_order: int
+
+class BatchReorderRequest(BaseModel):
+    items: list[BatchReorderItem]
+
+class BatchDeleteRequest(BaseModel):
+    ids: list[int]
+
+class BatchMoveRequest(BaseModel):
+    page_ids: list[int]
+    site_name: str
+    section_name: str
+
+class BatchItemResult(BaseModel):
+    id: int
+    status: str
+
+class BatchResponse(BaseModel):
+    applied: int
+    not_found: int
+    results: list[BatchItemResult]
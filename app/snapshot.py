@@ -0,0 +1,172 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.compression import accepts_encoding, encoding_weights
+from app.models import Site, Section, Page
+from contextlib import asynccontextmanager
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import logging
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; snapshots are then gzip (and identity) only
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; snapshots are then written without a lock
+    fcntl = None
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+# Root directory for static snapshots: {SNAPSHOT_DIR}/{site_name}/...
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+
+# Names that are safe to use as a path component
+SAFE_NAME = re.compile(r"^[A-Za-z0-9_][A-Za-z0-9_.-]*$")
+
+# Encodings written next to every file, in order of preference when serving
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")] if brotli else [("gzip", ".gz")]
+
+# Lock file in each site directory (SAFE_NAME rejects it, so it is never served)
+LOCK_FILE = ".snapshot.lock"
+
+PUBLISHED = {'schema_translate_map': {'draft': 'published'}}
+
+
+def site_dir(site_name: str) -> str:
+    if not SAFE_NAME.match(site_name):
+        raise ValueError(f"Unsafe site name for a snapshot path: {site_name}")
+    return os.path.join(SNAPSHOT_DIR, site_name)
+
+
+# Read the published site as plain dicts: the navigation manifest and one document per page
+async def load_published_site(db: AsyncSession, site_name: str):
+    result = await db.execute(
+        select(Site.id, Site.name, Site.title).where(Site.name == site_name).execution_options(**PUBLISHED)
+    )
+    site = result.first()
+    if not site:
+        return None, []
+
+    result = await db.execute(
+        select(Section.id, Section.name, Section.title)
+        .where(Section.site_id == site.id)
+        .order_by(Section.sort_order, Section.id)
+        .execution_options(**PUBLISHED)
+    )
+    sections = [{"id": row.id, "name": row.name, "title": row.title, "pages": []} for row in result.all()]
+    sections_by_id = {section["id"]: section for section in sections}
+
+    result = await db.execute(
+        select(Page.id, Page.section_id, Page.name, Page.title, Page.primary_image, Page.abstract, Page.content)
+        .where(Page.site_id == site.id, Page.section_id.in_(sections_by_id.keys()))
+        .order_by(Page.sort_order, Page.id)
+        .execution_options(**PUBLISHED)
+    )
+    pages = []
+    for row in result.all():
+        page = dict(row._mapping)
+        page["section_name"] = sections_by_id[row.section_id]["name"]
+        pages.append(page)
+
+    nav = {"site": {"id": site.id, "name": site.name, "title": site.title}, "sections": sections}
+    return nav, pages
+
+
+# Write one JSON document (identity + compressed variants) under a content-hashed name
+def _write_document(directory: str, prefix: str, document) -> str:
+    data = json.dumps(document, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    filename = f"{prefix}.{hashlib.sha256(data).hexdigest()[:16]}.json"
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        variants = [("", data), (".gz", gzip.compress(data, compresslevel=9))]
+        if brotli:
+            variants.append((".br", brotli.compress(data, quality=11)))
+        for suffix, payload in variants:
+            with open(path + suffix + ".tmp", "wb") as f:
+                f.write(payload)
+            os.replace(path + suffix + ".tmp", path + suffix)
+    return filename
+
+
+# Write all documents, then swap in the new manifest.json and remove files it no longer references
+def write_snapshot(site_name: str, nav: dict, pages: list):
+    directory = site_dir(site_name)
+    os.makedirs(directory, exist_ok=True)
+
+    page_files = {}
+    for page in pages:
+        filename = _write_document(directory, f"page-{page['id']}", page)
+        page_files[page["name"]] = filename
+    for section in nav["sections"]:
+        section["pages"] = [
+            {"name": page["name"], "title": page["title"], "file": page_files[page["name"]]}
+            for page in pages if page["section_id"] == section["id"]
+        ]
+    nav_file = _write_document(directory, "nav", nav)
+
+    manifest = {"nav": nav_file, "pages": page_files}
+    manifest_path = os.path.join(directory, "manifest.json")
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    keep = {nav_file, *page_files.values(), "manifest.json", LOCK_FILE}
+    for name in os.listdir(directory):
+        base = name[:-3] if name.endswith((".gz", ".br")) else name
+        if base not in keep:
+            os.remove(os.path.join(directory, name))
+    return manifest
+
+
+# Hold a site's snapshot lock. Snapshots are written after the publish commits, outside its
+# advisory lock, so two publishes (or rollbacks) of a site could otherwise write at once and
+# remove each other's files. The site is read under the lock too, so the last writer always
+# writes the latest published copy.
+@asynccontextmanager
+async def snapshot_lock(site_name: str):
+    directory = site_dir(site_name)
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(directory, exist_ok=True)
+    # flock locks belong to the open file, so this also serializes writers within one process
+    lock_file = open(os.path.join(directory, LOCK_FILE), "w")
+    try:
+        await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+        yield
+    finally:
+        lock_file.close()  # releases the lock
+
+
+# Export the published site to disk; compression and file I/O run off the event loop
+async def export_snapshot(db: AsyncSession, site_name: str):
+    async with snapshot_lock(site_name):
+        nav, pages = await load_published_site(db, site_name)
+        if nav is None:
+            logger.info("No published site to snapshot: %s", site_name)
+            return None
+        manifest = await asyncio.to_thread(write_snapshot, site_name, nav, pages)
+    logger.info("Snapshot written for site: %s (%s pages)", site_name, len(pages))
+    return manifest
+
+
+# Pick the best pre-compressed variant of a snapshot file for the client's Accept-Encoding.
+# Returns (path, content_encoding) or (None, None) if the file does not exist.
+def resolve_file(site_name: str, filename: str, accept_encoding: str = ""):
+    if not SAFE_NAME.match(filename):
+        return None, None
+    path = os.path.join(site_dir(site_name), filename)
+    if not os.path.isfile(path):
+        return None, None
+    weights = encoding_weights(accept_encoding)
+    for encoding, suffix in ENCODINGS:
+        if accepts_encoding(weights, encoding) and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
@@ -0,0 +1,128 @@
+from contextvars import ContextVar
+from sqlalchemy import event
+from utils.logging import request_id_var
+from uuid import uuid4
+import json
+import os
+import random
+import re
+import time
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+# Slow statements are written as JSON lines to this logger (see setup_logging's slow_query_file)
+slow_query_logger = logging.getLogger("app.slow_query")
+
+# Statements slower than this are logged (milliseconds; 0 or less disables the slow-query log)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Fraction of slow SELECTs that are re-run under EXPLAIN (ANALYZE, BUFFERS) for the log
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0"))
+# Longest parameter value kept in a log line
+SLOW_QUERY_MAX_PARAM_LENGTH = 200
+
+REQUEST_ID_HEADER = "x-request-id"
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# "METHOD /path" of the HTTP request being handled in the current task
+request_endpoint_var = ContextVar("request_endpoint", default=None)
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware that gives every request an id (the client's X-Request-ID if it is sane,
+    otherwise a new one), exposes it to log records through a contextvar, and echoes it back
+    in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        request_id = headers.get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1")
+        if not VALID_REQUEST_ID.match(request_id):
+            request_id = uuid4().hex
+        id_token = request_id_var.set(request_id)
+        endpoint_token = request_endpoint_var.set(f"{scope['method']} {scope['path']}")
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(id_token)
+            request_endpoint_var.reset(endpoint_token)
+
+
+def _loggable_params(parameters):
+    def shorten(value):
+        text = value if isinstance(value, str) else repr(value)
+        return text if len(text) <= SLOW_QUERY_MAX_PARAM_LENGTH else text[:SLOW_QUERY_MAX_PARAM_LENGTH] + "..."
+    if isinstance(parameters, dict):
+        return {key: shorten(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [shorten(value) for value in parameters]
+    return shorten(parameters)
+
+
+# Re-run a SELECT under EXPLAIN (ANALYZE, BUFFERS) on a separate cursor of the same connection.
+# Only plain SELECTs are explained, since ANALYZE executes the statement again; a savepoint
+# keeps a failed EXPLAIN from aborting the caller's transaction.
+def _explain(conn, statement: str, parameters):
+    if not statement.lstrip()[:6].upper() == "SELECT":
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters)
+            plan = cursor.fetchone()[0]
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        except Exception:
+            cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        return json.loads(plan) if isinstance(plan, str) else plan
+    except Exception as e:
+        logger.warning("EXPLAIN of a slow query failed: %s", e)
+        return None
+    finally:
+        cursor.close()
+
+
+# Log statements over SLOW_QUERY_MS on an engine as JSON lines, with the request that ran them
+def instrument_slow_queries(engine, name: str):
+    if SLOW_QUERY_MS <= 0:
+        return
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["slow_query_start_time"].pop()) * 1000
+        if duration_ms < SLOW_QUERY_MS:
+            return
+        entry = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "engine": name,
+            "request_id": request_id_var.get(),
+            "endpoint": request_endpoint_var.get(),
+            "duration_ms": round(duration_ms, 2),
+            "sql": statement,
+            "parameters": None if executemany else _loggable_params(parameters),
+            "executemany": executemany,
+        }
+        if not executemany and SLOW_QUERY_EXPLAIN_RATE > 0 and random.random() < SLOW_QUERY_EXPLAIN_RATE:
+            entry["explain"] = _explain(conn, statement, parameters)
+        slow_query_logger.warning(json.dumps(entry, default=str))
@@ -0,0 +1,7 @@
+"""
+Endpoint benchmarks for guten-datalake.
+
+Seeds a synthetic dataset into a throwaway (or given) Postgres database, drives the
+FastAPI app in-process through an ASGI client and writes latency percentiles and
+throughput per endpoint to JSON. See `python -m benchmarks --help`.
+"""
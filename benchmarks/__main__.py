@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import logging
+
+from benchmarks.dataset import DatasetSize, site_name, section_name, page_name
+from benchmarks.postgres import TemporaryPostgres, create_database
+from benchmarks.runner import Scenario, run_benchmarks, find_regressions
+
+# Logger for this file
+logger = logging.getLogger("benchmarks")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Seed a synthetic dataset and benchmark the guten-datalake endpoints in-process.",
+    )
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="postgresql+asyncpg URL of a DEDICATED database (it is dropped and recreated). "
+                             "Default: start a temporary Postgres with initdb/pg_ctl")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the database as it is")
+    parser.add_argument("--sites", type=int, default=DatasetSize.sites)
+    parser.add_argument("--sections", type=int, default=DatasetSize.sections, help="per site")
+    parser.add_argument("--pages", type=int, default=DatasetSize.pages, help="per section")
+    parser.add_argument("--refs", type=int, default=DatasetSize.refs, help="per page")
+    parser.add_argument("--notes", type=int, default=DatasetSize.notes, help="per page")
+    parser.add_argument("--content-bytes", type=int, default=DatasetSize.content_bytes)
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--only", help="run only scenarios whose name contains this text")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p95 / throughput change against the baseline (fraction)")
+    return parser.parse_args()
+
+
+def build_scenarios(size: DatasetSize):
+    from app import crud
+    from app.database import PublishSessionLocal
+
+    def any_site(rng):
+        return rng.randrange(size.sites)
+
+    def any_page(rng):
+        site, section = any_site(rng), rng.randrange(size.sections)
+        return site, section, page_name(site, section, rng.randrange(size.pages))
+
+    def get(path):
+        return ("GET", path, None)
+
+    def publish(incremental, blue_green=False):
+        async def call(rng):
+            async with PublishSessionLocal() as db:
+                await crud.publish_site(db, site_name(any_site(rng)), incremental=incremental, blue_green=blue_green)
+        return call
+
+    def page_query(rng):
+        site, section, page = any_page(rng)
+        return page, f"site={site_name(site)}&section={section_name(section)}"
+
+    def published_page(rng):
+        site, _, page = any_page(rng)
+        return get(f"/guten/published/pages/{page}?site={site_name(site)}")
+
+    return [
+        Scenario("GET /guten/sites", request=lambda rng: get("/guten/sites")),
+        Scenario("GET /guten/sites/{site_name}/tree",
+                 request=lambda rng: get(f"/guten/sites/{site_name(any_site(rng))}/tree")),
+        Scenario("GET /guten/sections",
+                 request=lambda rng: get(f"/guten/sections?site={site_name(any_site(rng))}")),
+        Scenario("GET /guten/pages",
+                 request=lambda rng: get(f"/guten/pages?{page_query(rng)[1]}")),
+        Scenario("GET /guten/pages?summary=true&limit=50",
+                 request=lambda rng: get(f"/guten/pages?{page_query(rng)[1]}&summary=true&limit=50")),
+        Scenario("GET /guten/pages/{page_name}",
+                 request=lambda rng: get("/guten/pages/{}?{}".format(*page_query(rng)))),
+        Scenario("GET /guten/pages_all/{site_name}",
+                 request=lambda rng: get(f"/guten/pages_all/{site_name(any_site(rng))}")),
+        Scenario("GET /guten/refs",
+                 request=lambda rng: get("/guten/refs?{1}&page={0}".format(*page_query(rng)))),
+        Scenario("GET /guten/notes",
+                 request=lambda rng: get("/guten/notes?{1}&page={0}".format(*page_query(rng)))),
+        Scenario("GET /guten/search",
+                 request=lambda rng: get(f"/guten/search?site={site_name(any_site(rng))}&q=lorem+ipsum")),
+        # Publishes of one site serialize on its advisory lock, so they run one at a time
+        Scenario("crud.publish_site (full)", call=publish(False), max_concurrency=1, requests=3),
+        Scenario("crud.publish_site (incremental)", call=publish(True), max_concurrency=1, requests=5),
+        Scenario("crud.publish_site (blue/green)", call=publish(False, blue_green=True), max_concurrency=1, requests=3),
+        Scenario("GET /guten/published/pages/{page_name}", request=published_page),
+        Scenario("GET /guten/published/nav/{site_name}", request=lambda rng: get(f"/guten/published/nav/{site_name(any_site(rng))}")),
+    ]
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def benchmark(args, database_url: str, size: DatasetSize):
+    if not args.skip_seed:
+        await create_database(database_url)
+
+    # The app reads its settings at import time
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("DB_ECHO", "false")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("SLOW_QUERY_MS", "0")
+    import httpx
+    from app.main import app
+    from app.database import SessionLocal, engine, publish_engine
+    from benchmarks.dataset import seed_dataset
+
+    try:
+        if not args.skip_seed:
+            async with SessionLocal() as db:
+                counts = await seed_dataset(db, size)
+            logger.warning("Seeded %s", counts)
+
+        scenarios = build_scenarios(size)
+        if args.only:
+            scenarios = [scenario for scenario in scenarios if args.only in scenario.name]
+        levels = [int(level) for level in args.concurrency.split(",")]
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            return await run_benchmarks(client, scenarios, levels, args.requests, args.warmup)
+    finally:
+        await engine.dispose()
+        await publish_engine.dispose()
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    args = parse_args()
+    size = DatasetSize(args.sites, args.sections, args.pages, args.refs, args.notes, args.content_bytes)
+
+    if args.database_url:
+        results = asyncio.run(benchmark(args, args.database_url, size))
+    else:
+        with TemporaryPostgres() as pg:
+            results = asyncio.run(benchmark(args, pg.url, size))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "dataset": size.as_dict(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.warning("Results written to %s", args.output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(baseline, report, args.tolerance)
+        for regression in regressions:
+            logger.error("REGRESSION %s", regression)
+        if regressions:
+            sys.exit(1)
+        logger.warning("No regressions against %s (tolerance %.0f%%)", args.baseline, args.tolerance * 100)
+
+
+if __name__ == "__main__":
+    main()
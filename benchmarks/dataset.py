@@ -0,0 +1,101 @@
+from dataclasses import dataclass, asdict
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Site, Section, Page, Ref, Note
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+# Rows per multi-row INSERT while seeding
+SEED_BATCH_SIZE = 1000
+
+# Filler text so page bodies have a realistic size
+LOREM = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt "
+    "ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation. "
+)
+
+
+@dataclass
+class DatasetSize:
+    sites: int = 2
+    sections: int = 5     # per site
+    pages: int = 40       # per section
+    refs: int = 3         # per page
+    notes: int = 2        # per page
+    content_bytes: int = 4000
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def site_name(i: int) -> str:
+    return f"bench-site-{i}"
+
+
+def section_name(i: int) -> str:
+    return f"section-{i}"
+
+
+def page_name(site: int, section: int, page: int) -> str:
+    # Page names are unique across all sites
+    return f"s{site}-sec{section}-page-{page}"
+
+
+async def _insert_batches(db: AsyncSession, model, rows: list, returning=None):
+    ids = []
+    for start in range(0, len(rows), SEED_BATCH_SIZE):
+        batch = rows[start:start + SEED_BATCH_SIZE]
+        if returning is not None:
+            result = await db.execute(insert(model).returning(*returning), batch)
+            ids.extend(result.all())
+        else:
+            await db.execute(insert(model), batch)
+    return ids
+
+
+# Write sites x sections x pages x (refs, notes) into the draft schema
+async def seed_dataset(db: AsyncSession, size: DatasetSize):
+    content = (LOREM * (size.content_bytes // len(LOREM) + 1))[:size.content_bytes]
+
+    site_rows = [
+        {"name": site_name(i), "title": f"Bench Site {i}", "url": f"https://bench-{i}.example.com",
+         "logo": "logo.png", "favicon": "favicon.ico", "color": "#336699"}
+        for i in range(size.sites)
+    ]
+    sites = await _insert_batches(db, Site, site_rows, returning=(Site.id, Site.name))
+
+    section_rows = [
+        {"site_id": site_id, "name": section_name(j), "title": f"Section {j}", "sort_order": j}
+        for site_id, _ in sites for j in range(size.sections)
+    ]
+    sections = await _insert_batches(db, Section, section_rows, returning=(Section.id, Section.site_id, Section.name))
+    site_index = {site_id: i for i, (site_id, _) in enumerate(sites)}
+
+    page_rows = []
+    for section_id, site_id, name in sections:
+        j = int(name.rsplit("-", 1)[1])
+        for k in range(size.pages):
+            page_rows.append({
+                "section_id": section_id, "site_id": site_id, "name": page_name(site_index[site_id], j, k),
+                "title": f"Page {k} of section {j}", "primary_image": f"img/{k}.png",
+                "abstract": LOREM[:160], "content": content, "sort_order": k,
+            })
+    pages = await _insert_batches(db, Page, page_rows, returning=(Page.id, Page.site_id))
+
+    ref_rows = [
+        {"page_id": page_id, "site_id": site_id, "url": f"https://example.com/{page_id}/{n}", "description": f"Ref {n}",
+         "type": "external_link", "sort_order": n}
+        for page_id, site_id in pages for n in range(size.refs)
+    ]
+    await _insert_batches(db, Ref, ref_rows)
+    note_rows = [{"page_id": page_id, "site_id": site_id, "note": f"Note {n} on page {page_id}"}
+                 for page_id, site_id in pages for n in range(size.notes)]
+    await _insert_batches(db, Note, note_rows)
+
+    await db.commit()
+    counts = {"sites": len(sites), "sections": len(sections), "pages": len(pages),
+              "refs": len(ref_rows), "notes": len(note_rows)}
+    logger.info("Seeded benchmark dataset: %s", counts)
+    return counts
@@ -0,0 +1,92 @@
+import asyncpg
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+SCHEMA_FILE = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "scripts", "database", "schema.sql"))
+BENCH_DATABASE = "guten_bench"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TemporaryPostgres:
+    """
+    A throwaway Postgres cluster in a temp directory, started with the initdb / pg_ctl
+    binaries on PATH (or in PG_BIN). Removed again on exit.
+
+        with TemporaryPostgres() as pg:
+            url = pg.url  # postgresql+asyncpg://...
+    """
+
+    def __init__(self, bin_dir: str = None):
+        self.bin_dir = bin_dir or os.getenv("PG_BIN", "")
+        self.data_dir = None
+        self.port = None
+        self.url = None
+
+    def _bin(self, name: str) -> str:
+        path = os.path.join(self.bin_dir, name) if self.bin_dir else shutil.which(name)
+        if not path or not os.path.exists(path):
+            raise RuntimeError(f"{name} not found; put the Postgres binaries on PATH, set PG_BIN, or pass --database-url")
+        return path
+
+    def __enter__(self):
+        initdb, pg_ctl = self._bin("initdb"), self._bin("pg_ctl")
+        self.data_dir = tempfile.mkdtemp(prefix="guten-bench-pg-")
+        self.port = _free_port()
+        try:
+            subprocess.run(
+                [initdb, "-D", self.data_dir, "-U", "postgres", "-A", "trust", "--no-sync"],
+                check=True, stdout=subprocess.DEVNULL,
+            )
+            subprocess.run(
+                [pg_ctl, "-D", self.data_dir, "-w", "-l", os.path.join(self.data_dir, "server.log"),
+                 "-o", f"-p {self.port} -k {self.data_dir} -c fsync=off -c synchronous_commit=off", "start"],
+                check=True, stdout=subprocess.DEVNULL,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+            raise
+        self.url = f"postgresql+asyncpg://postgres@127.0.0.1:{self.port}/{BENCH_DATABASE}"
+        logger.info("Started temporary Postgres on port %s", self.port)
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.run([self._bin("pg_ctl"), "-D", self.data_dir, "-m", "immediate", "stop"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+def _asyncpg_dsn(url: str) -> str:
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+# Drop and recreate the benchmark database and apply scripts/database/schema.sql to it
+async def create_database(url: str):
+    dsn = _asyncpg_dsn(url)
+    base, database = dsn.rsplit("/", 1)
+    conn = await asyncpg.connect(base + "/postgres")
+    try:
+        await conn.execute(f'DROP DATABASE IF EXISTS "{database}"')
+        await conn.execute(f'CREATE DATABASE "{database}"')
+    finally:
+        await conn.close()
+
+    with open(SCHEMA_FILE, encoding="utf-8") as f:
+        schema = f.read()
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute(schema)
+    finally:
+        await conn.close()
+    logger.info("Created benchmark database %s", database)
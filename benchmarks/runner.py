@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+from typing import Callable, Optional
+import asyncio
+import random
+import statistics
+import time
+import logging
+
+# Logger for this file
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Scenario:
+    """
+    One benchmarked operation. `request(rng)` returns (method, path, json_body) for an HTTP
+    call through the ASGI client; `call(rng)` is an awaitable used instead for operations
+    that are not a single request (e.g. crud.publish_site). `max_concurrency` caps the
+    concurrency level, e.g. for publishes that serialize on the site's advisory lock.
+    """
+    name: str
+    request: Optional[Callable] = None
+    call: Optional[Callable] = None
+    max_concurrency: Optional[int] = None
+    requests: Optional[int] = None  # overrides the run's request count (for slow operations)
+
+
+# Nearest-rank percentile of a sorted list
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies: list, errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+# Run one scenario: `concurrency` workers share `total` operations; returns the summary
+async def run_scenario(client, scenario: Scenario, concurrency: int, total: int, warmup: int = 0, seed: int = 0):
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+
+    async def execute():
+        if scenario.call is not None:
+            await scenario.call(rng)
+            return True
+        method, path, body = scenario.request(rng)
+        response = await client.request(method, path, json=body)
+        return response.status_code < 400
+
+    for _ in range(warmup):
+        await execute()
+
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                ok = await execute()
+            except Exception as e:
+                logger.warning("Benchmark %s failed: %s", scenario.name, e)
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+# Run every scenario at every concurrency level; results are keyed "name @cN"
+async def run_benchmarks(client, scenarios: list, concurrency_levels: list, total: int, warmup: int = 5):
+    results = {}
+    for scenario in scenarios:
+        levels = sorted({min(level, scenario.max_concurrency or level) for level in concurrency_levels})
+        for level in levels:
+            key = f"{scenario.name} @c{level}"
+            results[key] = await run_scenario(client, scenario, level, scenario.requests or total, warmup)
+            logger.warning("%-55s p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms  %9.1f req/s  errors %d",
+                           key, results[key]["p50_ms"], results[key]["p95_ms"], results[key]["p99_ms"],
+                           results[key]["throughput_rps"], results[key]["errors"])
+    return results
+
+
+# Compare a run with a baseline run: a result regresses when its p95 grew, or its
+# throughput shrank, by more than `tolerance` (a fraction). Returns readable messages.
+def find_regressions(baseline: dict, current: dict, tolerance: float = 0.2):
+    regressions = []
+    for key, before in baseline.get("results", {}).items():
+        after = current.get("results", {}).get(key)
+        if after is None:
+            continue
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{key}: errors {before['errors']} -> {after['errors']}")
+        if before["p95_ms"] > 0 and after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {before['p95_ms']} ms -> {after['p95_ms']} ms")
+        if after["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {before['throughput_rps']} -> {after['throughput_rps']} req/s")
+    return regressions
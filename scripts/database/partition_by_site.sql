@@ -0,0 +1,212 @@
+-- Partition pages, refs and notes (draft and published) by site: one LIST partition per site,
+-- named {table}_site_{site_id}. Optional: run once, after schema.sql, then set SITE_PARTITIONS=true.
+--
+--   psql -d guten_datalake -f scripts/database/partition_by_site.sql
+--
+-- Needs PostgreSQL 15+: a page moved to another site moves to another partition, and its refs and
+-- notes must follow it through ON UPDATE CASCADE (older versions delete them instead).
+-- The tables are rewritten under an exclusive lock, so run it in a maintenance window.
+--
+-- What changes:
+--   * primary keys become (site_id, id), and page names are unique per site instead of globally
+--     (a partitioned table's unique keys must include the partition key);
+--   * published refs and notes no longer reference published.pages, so the partitions of a site
+--     can be truncated on their own (publishing deletes their rows explicitly anyway);
+--   * workflow.llm_updates loses its foreign key to draft.pages, for the same reason.
+-- Re-running schema.sql afterwards is safe.
+
+BEGIN;
+
+-- 1️ Site Partition Functions
+
+-- Create and attach the draft and published partitions of a site, if missing. CREATE + ATTACH
+-- PARTITION only takes a SHARE UPDATE EXCLUSIVE lock on the parents, so other sites are read
+-- and written meanwhile.
+CREATE OR REPLACE FUNCTION workflow.create_site_partitions(partition_site_id INT) RETURNS VOID AS $$
+DECLARE
+    target_schema TEXT;
+    target_table TEXT;
+    partition_name TEXT;
+BEGIN
+    FOREACH target_schema IN ARRAY ARRAY['draft', 'published'] LOOP
+        FOREACH target_table IN ARRAY ARRAY['pages', 'refs', 'notes'] LOOP
+            partition_name := format('%s_site_%s', target_table, partition_site_id);
+            CONTINUE WHEN to_regclass(format('%I.%I', target_schema, partition_name)) IS NOT NULL;
+            EXECUTE format('CREATE TABLE %I.%I (LIKE %I.%I INCLUDING DEFAULTS INCLUDING GENERATED '
+                           'INCLUDING COMPRESSION INCLUDING STORAGE INCLUDING CONSTRAINTS)',
+                           target_schema, partition_name, target_schema, target_table);
+            IF target_table = 'pages' THEN
+                EXECUTE format('ALTER TABLE %I.%I SET (toast_tuple_target = 256)', target_schema, partition_name);
+            END IF;
+            EXECUTE format('ALTER TABLE %I.%I ATTACH PARTITION %I.%I FOR VALUES IN (%s)',
+                           target_schema, target_table, target_schema, partition_name, partition_site_id);
+        END LOOP;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Detach and drop the draft partitions of a site (children first) ahead of deleting the site:
+-- one DDL statement per table instead of a cascaded row-by-row delete. Returns false if the
+-- site has no partitions.
+CREATE OR REPLACE FUNCTION workflow.drop_site_partitions(partition_site_id INT) RETURNS BOOLEAN AS $$
+DECLARE
+    target_table TEXT;
+    partition_name TEXT;
+    dropped BOOLEAN := FALSE;
+BEGIN
+    FOREACH target_table IN ARRAY ARRAY['notes', 'refs', 'pages'] LOOP
+        partition_name := format('%s_site_%s', target_table, partition_site_id);
+        CONTINUE WHEN to_regclass(format('draft.%I', partition_name)) IS NULL;
+        EXECUTE format('ALTER TABLE draft.%I DETACH PARTITION draft.%I', target_table, partition_name);
+        EXECUTE format('DROP TABLE draft.%I', partition_name);
+        dropped := TRUE;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION workflow.create_new_site_partitions() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM workflow.create_site_partitions(NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Replace a table with an empty copy partitioned by site_id. The old table is kept as
+-- {table}_unpartitioned until its rows are copied; the id sequence moves to the new table.
+CREATE OR REPLACE FUNCTION workflow.partition_by_site(target_schema TEXT, target_table TEXT) RETURNS VOID AS $$
+DECLARE
+    old_table TEXT := target_table || '_unpartitioned';
+    id_sequence TEXT;
+BEGIN
+    EXECUTE format('ALTER TABLE %I.%I RENAME TO %I', target_schema, target_table, old_table);
+    EXECUTE format('CREATE TABLE %I.%I (LIKE %I.%I INCLUDING DEFAULTS INCLUDING GENERATED '
+                   'INCLUDING COMPRESSION INCLUDING STORAGE INCLUDING CONSTRAINTS) PARTITION BY LIST (site_id)',
+                   target_schema, target_table, target_schema, old_table);
+    id_sequence := pg_get_serial_sequence(format('%I.%I', target_schema, old_table), 'id');
+    IF id_sequence IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.%I.id', id_sequence, target_schema, target_table);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Copy the rows of {table}_unpartitioned into the partitioned table (generated columns are recomputed)
+CREATE OR REPLACE FUNCTION workflow.copy_to_partitions(target_schema TEXT, target_table TEXT) RETURNS VOID AS $$
+DECLARE
+    old_table TEXT := target_table || '_unpartitioned';
+    columns TEXT;
+BEGIN
+    SELECT string_agg(quote_ident(column_name), ', ' ORDER BY ordinal_position) INTO columns
+    FROM information_schema.columns
+    WHERE table_schema = target_schema AND table_name = old_table AND is_generated = 'NEVER';
+    EXECUTE format('INSERT INTO %I.%I (%s) SELECT %s FROM %I.%I',
+                   target_schema, target_table, columns, columns, target_schema, old_table);
+END;
+$$ LANGUAGE plpgsql;
+
+-- 2️ Save What Depends on the Old Tables (published materialized views, draft triggers)
+
+CREATE TEMP TABLE saved_definitions (position SERIAL, definition TEXT) ON COMMIT DROP;
+INSERT INTO saved_definitions (definition)
+SELECT format('CREATE MATERIALIZED VIEW %I.%I AS %s', schemaname, matviewname, regexp_replace(definition, ';\s*$', ''))
+FROM pg_matviews WHERE schemaname = 'published';
+INSERT INTO saved_definitions (definition)
+SELECT i.indexdef FROM pg_indexes i JOIN pg_matviews v ON v.schemaname = i.schemaname AND v.matviewname = i.tablename
+WHERE i.schemaname = 'published';
+INSERT INTO saved_definitions (definition)
+SELECT pg_get_triggerdef(oid) FROM pg_trigger
+WHERE tgrelid IN ('draft.pages'::regclass, 'draft.refs'::regclass, 'draft.notes'::regclass) AND NOT tgisinternal;
+
+DO $$
+DECLARE
+    view_name TEXT;
+BEGIN
+    FOR view_name IN SELECT format('%I.%I', schemaname, matviewname) FROM pg_matviews WHERE schemaname = 'published' LOOP
+        EXECUTE 'DROP MATERIALIZED VIEW ' || view_name;
+    END LOOP;
+END $$;
+
+-- 3️ Partitioned Tables, One Partition per Site
+-- (published sites too: the published schema may still hold sites deleted from draft)
+
+SELECT workflow.partition_by_site('draft', 'pages');
+SELECT workflow.partition_by_site('draft', 'refs');
+SELECT workflow.partition_by_site('draft', 'notes');
+SELECT workflow.partition_by_site('published', 'pages');
+SELECT workflow.partition_by_site('published', 'refs');
+SELECT workflow.partition_by_site('published', 'notes');
+
+SELECT workflow.create_site_partitions(id) FROM (SELECT id FROM draft.sites UNION SELECT id FROM published.sites) AS sites;
+
+-- 4️ Copy the Rows and Drop the Old Tables
+
+SELECT workflow.copy_to_partitions('draft', 'pages');
+SELECT workflow.copy_to_partitions('draft', 'refs');
+SELECT workflow.copy_to_partitions('draft', 'notes');
+SELECT workflow.copy_to_partitions('published', 'pages');
+SELECT workflow.copy_to_partitions('published', 'refs');
+SELECT workflow.copy_to_partitions('published', 'notes');
+
+ALTER TABLE workflow.llm_updates DROP CONSTRAINT IF EXISTS llm_updates_page_id_fkey;
+DROP TABLE draft.notes_unpartitioned, draft.refs_unpartitioned, draft.pages_unpartitioned,
+           published.notes_unpartitioned, published.refs_unpartitioned, published.pages_unpartitioned;
+
+-- 5️ Keys, Indexes and Foreign Keys (declared on the parents; every partition gets its own)
+-- Keys are named after the indexes of schema.sql section 13️ that they replace.
+
+ALTER TABLE draft.pages ADD CONSTRAINT idx_draft_pages_site_id PRIMARY KEY (site_id, id);
+ALTER TABLE draft.refs ADD PRIMARY KEY (site_id, id);
+ALTER TABLE draft.notes ADD PRIMARY KEY (site_id, id);
+ALTER TABLE published.pages ADD CONSTRAINT idx_published_pages_site PRIMARY KEY (site_id, id);
+ALTER TABLE published.refs ADD CONSTRAINT idx_published_refs_site PRIMARY KEY (site_id, id);
+ALTER TABLE published.notes ADD CONSTRAINT idx_published_notes_site PRIMARY KEY (site_id, id);
+
+ALTER TABLE draft.pages ADD CONSTRAINT pages_site_name_key UNIQUE (site_id, name);
+ALTER TABLE published.pages ADD CONSTRAINT pages_site_name_key UNIQUE (site_id, name);
+
+-- Lookups by id alone (e.g. /guten/page_by_id, batch endpoints) probe each partition's index
+CREATE INDEX idx_draft_pages_id ON draft.pages (id);
+CREATE INDEX idx_draft_refs_id ON draft.refs (id);
+CREATE INDEX idx_draft_notes_id ON draft.notes (id);
+CREATE INDEX idx_published_pages_id ON published.pages (id);
+CREATE INDEX idx_published_refs_id ON published.refs (id);
+CREATE INDEX idx_published_notes_id ON published.notes (id);
+
+CREATE INDEX idx_draft_pages_section ON draft.pages (section_id);
+CREATE INDEX idx_published_pages_section ON published.pages (section_id);
+CREATE INDEX idx_draft_pages_search ON draft.pages USING GIN (search_vector);
+CREATE INDEX idx_published_pages_search ON published.pages USING GIN (search_vector);
+CREATE INDEX idx_draft_refs_site_page ON draft.refs (site_id, page_id);
+CREATE INDEX idx_draft_notes_site_page ON draft.notes (site_id, page_id);
+
+ALTER TABLE draft.pages ADD CONSTRAINT pages_section_id_fkey FOREIGN KEY (section_id)
+    REFERENCES draft.sections (id) ON DELETE CASCADE;
+ALTER TABLE draft.pages ADD CONSTRAINT pages_template_id_fkey FOREIGN KEY (template_id)
+    REFERENCES draft.templates (id);
+ALTER TABLE draft.refs ADD CONSTRAINT refs_site_page_fkey FOREIGN KEY (site_id, page_id)
+    REFERENCES draft.pages (site_id, id) ON UPDATE CASCADE ON DELETE CASCADE;
+ALTER TABLE draft.notes ADD CONSTRAINT notes_site_page_fkey FOREIGN KEY (site_id, page_id)
+    REFERENCES draft.pages (site_id, id) ON UPDATE CASCADE ON DELETE CASCADE;
+ALTER TABLE published.pages ADD CONSTRAINT fk_published_section FOREIGN KEY (section_id)
+    REFERENCES published.sections (id) ON DELETE CASCADE;
+ALTER TABLE published.pages ADD CONSTRAINT fk_published_template FOREIGN KEY (template_id)
+    REFERENCES published.templates (id);
+
+-- 6️ Restore the Views and Triggers, and Partition New Sites as They Are Created
+
+DO $$
+DECLARE
+    statement TEXT;
+BEGIN
+    FOR statement IN SELECT definition FROM saved_definitions ORDER BY position LOOP
+        EXECUTE statement;
+    END LOOP;
+END $$;
+
+DROP TRIGGER IF EXISTS create_site_partitions ON draft.sites;
+CREATE TRIGGER create_site_partitions AFTER INSERT ON draft.sites
+    FOR EACH ROW EXECUTE FUNCTION workflow.create_new_site_partitions();
+
+COMMIT;
+
+ANALYZE draft.pages, draft.refs, draft.notes, published.pages, published.refs, published.notes;
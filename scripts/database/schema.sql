@@ -25,6 +25,9 @@ CREATE TABLE IF NOT EXISTS draft.sites (
     title VARCHAR(255) NOT NULL,        
     logo VARCHAR(255),                  
     url VARCHAR(255),                    
+    favicon VARCHAR(255),
+    color VARCHAR(50),
+    landing_page_id INT,
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
@@ -34,6 +37,8 @@ CREATE TABLE IF NOT EXISTS draft.sections (
     id SERIAL PRIMARY KEY,
     site_id INT REFERENCES draft.sites(id) ON DELETE CASCADE,
     name VARCHAR(255) NOT NULL,      
+    title VARCHAR(255) NOT NULL,
+    label VARCHAR(255),
     theme_id INT REFERENCES draft.themes(id),  
     sort_order INT DEFAULT 0,
     created_at TIMESTAMP DEFAULT NOW(),
@@ -54,6 +59,7 @@ CREATE TABLE IF NOT EXISTS draft.pages (
     section_id INT REFERENCES draft.sections(id) ON DELETE CASCADE,
     template_id INT REFERENCES draft.templates(id),  
     name VARCHAR(255) NOT NULL UNIQUE,         
+    title VARCHAR(255) NOT NULL,
     primary_image VARCHAR(255),                     
     abstract TEXT,                                  
     content TEXT NOT NULL,                          
@@ -107,6 +113,7 @@ CREATE TABLE IF NOT EXISTS published.sections (
     id SERIAL PRIMARY KEY,
     site_id INT NOT NULL,
     name VARCHAR(255) NOT NULL,      
+    title VARCHAR(255) NOT NULL,
     theme_id INT,
     sort_order INT DEFAULT 0,
     created_at TIMESTAMP DEFAULT NOW(),
@@ -126,6 +133,7 @@ CREATE TABLE IF NOT EXISTS published.pages (
     section_id INT NOT NULL,
     template_id INT,
     name VARCHAR(255) NOT NULL UNIQUE,         
+    title VARCHAR(255) NOT NULL,
     primary_image VARCHAR(255),                     
     abstract TEXT,                                  
     content TEXT NOT NULL,                          
@@ -155,6 +163,16 @@ CREATE TABLE IF NOT EXISTS published.notes (
     CONSTRAINT fk_published_page FOREIGN KEY (page_id) REFERENCES published.pages(id) ON DELETE CASCADE
 );
 
+-- Columns the API uses that databases created from an older version of this file lack
+ALTER TABLE draft.sites ADD COLUMN IF NOT EXISTS favicon VARCHAR(255);
+ALTER TABLE draft.sites ADD COLUMN IF NOT EXISTS color VARCHAR(50);
+ALTER TABLE draft.sites ADD COLUMN IF NOT EXISTS landing_page_id INT;
+ALTER TABLE draft.sections ADD COLUMN IF NOT EXISTS title VARCHAR(255);
+ALTER TABLE draft.sections ADD COLUMN IF NOT EXISTS label VARCHAR(255);
+ALTER TABLE draft.pages ADD COLUMN IF NOT EXISTS title VARCHAR(255);
+ALTER TABLE published.sections ADD COLUMN IF NOT EXISTS title VARCHAR(255);
+ALTER TABLE published.pages ADD COLUMN IF NOT EXISTS title VARCHAR(255);
+
 -- 5️ Workflow Schema (Publishing Lifecycle & AI Processing)
 
 -- Tracks publishing requests & approvals
@@ -186,3 +204,249 @@ CREATE TABLE IF NOT EXISTS workflow.publishing_log (
     timestamp TIMESTAMP DEFAULT NOW(),
     details TEXT
 );
+
+-- 6️ Publish Job Queue (workflow.publishing_requests doubles as the job table)
+
+ALTER TABLE workflow.publishing_requests ADD COLUMN IF NOT EXISTS incremental BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE workflow.publishing_requests ADD COLUMN IF NOT EXISTS snapshot BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE workflow.publishing_requests ADD COLUMN IF NOT EXISTS progress TEXT;
+ALTER TABLE workflow.publishing_requests ADD COLUMN IF NOT EXISTS error TEXT;
+ALTER TABLE workflow.publishing_requests ADD COLUMN IF NOT EXISTS started_at TIMESTAMP;
+ALTER TABLE workflow.publishing_requests ADD COLUMN IF NOT EXISTS finished_at TIMESTAMP;
+
+ALTER TABLE workflow.publishing_requests DROP CONSTRAINT IF EXISTS publishing_requests_status_check;
+ALTER TABLE workflow.publishing_requests ADD CONSTRAINT publishing_requests_status_check
+    CHECK (status IN ('pending', 'approved', 'rejected', 'running', 'completed', 'failed'));
+
+CREATE INDEX IF NOT EXISTS idx_publishing_requests_pending
+    ON workflow.publishing_requests (id) WHERE status = 'pending';
+
+-- 7️ Full-Text Search (title weighted over abstract over content)
+
+ALTER TABLE draft.pages ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(abstract, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'C')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS idx_draft_pages_search ON draft.pages USING GIN (search_vector);
+
+ALTER TABLE published.pages ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(abstract, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'C')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS idx_published_pages_search ON published.pages USING GIN (search_vector);
+
+-- 8️ Row Versions (updated_at drives ETag / Last-Modified on GET; the app bumps it on every update)
+
+ALTER TABLE draft.refs ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+ALTER TABLE draft.notes ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+
+-- 9️ Page Body Storage (lz4-compressed, moved out of line early so page rows stay narrow)
+-- Needs PostgreSQL 14+ built with lz4 (without it, the default pglz is kept). Existing bodies keep
+-- their old compression until rewritten, e.g. with VACUUM FULL draft.pages; VACUUM FULL published.pages;
+
+DO $$
+BEGIN
+    ALTER TABLE draft.pages ALTER COLUMN content SET COMPRESSION lz4;
+    ALTER TABLE draft.pages ALTER COLUMN abstract SET COMPRESSION lz4;
+    ALTER TABLE published.pages ALTER COLUMN content SET COMPRESSION lz4;
+    ALTER TABLE published.pages ALTER COLUMN abstract SET COMPRESSION lz4;
+EXCEPTION WHEN feature_not_supported THEN
+    RAISE NOTICE 'lz4 not available, page bodies keep the default compression';
+END $$;
+-- Partitioned pages tables (partition_by_site.sql) take it per partition instead
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'draft.pages'::regclass) = 'r' THEN
+        ALTER TABLE draft.pages SET (toast_tuple_target = 256);
+    END IF;
+    IF (SELECT relkind FROM pg_class WHERE oid = 'published.pages'::regclass) = 'r' THEN
+        ALTER TABLE published.pages SET (toast_tuple_target = 256);
+    END IF;
+END $$;
+
+-- 10️ Blue/Green Publishing (POST /guten/publish/{site_name}?blue_green=true)
+-- The published schema is rebuilt as published_staging and swapped in by renaming schemas;
+-- the replaced generation stays as published_previous for rollback. The API's database user
+-- must own the published schema (and be allowed to create schemas in the database).
+
+ALTER TABLE workflow.publishing_requests ADD COLUMN IF NOT EXISTS blue_green BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- 11️ Published Navigation (one row per published site: sections by sort_order with their page
+-- names and titles, served by GET /guten/published/nav/{site_name}; refreshed by every publish)
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS published.site_nav AS
+SELECT site.name AS site_name,
+       jsonb_build_object(
+           'site_name', site.name,
+           'title', site.title,
+           'sections', COALESCE((
+               SELECT jsonb_agg(jsonb_build_object(
+                          'name', sec.name,
+                          'title', sec.title,
+                          'pages', COALESCE((
+                              SELECT jsonb_agg(jsonb_build_object('name', page.name, 'title', page.title)
+                                               ORDER BY page.sort_order, page.id)
+                              FROM published.pages page WHERE page.section_id = sec.id
+                          ), '[]'::jsonb)
+                      ) ORDER BY sec.sort_order, sec.id)
+               FROM published.sections sec WHERE sec.site_id = site.id
+           ), '[]'::jsonb)
+       ) AS nav
+FROM published.sites site;
+
+-- Unique index: the lookup by site, and required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_published_site_nav_site ON published.site_nav (site_name);
+
+-- 12️ Change Feed (GET /guten/changes). Every statement that writes to a draft table, and every
+-- publish or rollback, adds one row per site to workflow.change_events and sends it as JSON on
+-- the guten_changes channel (delivered at commit). The triggers are per statement, so a bulk
+-- import or batch write of N rows adds one event per site rather than N.
+
+CREATE TABLE IF NOT EXISTS workflow.change_events (
+    id BIGSERIAL PRIMARY KEY,
+    entity VARCHAR(50) NOT NULL,       -- sites, sections, pages, refs, notes, published
+    entity_id INT,                     -- the row's id; NULL when the statement changed several rows
+    site VARCHAR(255),
+    action VARCHAR(50) NOT NULL,       -- insert, update, delete, publish, rollback
+    version TIMESTAMP,                 -- latest updated_at of the rows (publish time for published)
+    row_count INT NOT NULL DEFAULT 1,  -- rows of the site the statement changed
+    created_at TIMESTAMP DEFAULT NOW()
+);
+ALTER TABLE workflow.change_events ALTER COLUMN entity_id DROP NOT NULL;
+ALTER TABLE workflow.change_events ADD COLUMN IF NOT EXISTS row_count INT NOT NULL DEFAULT 1;
+CREATE INDEX IF NOT EXISTS idx_change_events_created_at ON workflow.change_events (created_at);
+
+DROP FUNCTION IF EXISTS workflow.emit_change(TEXT, INT, TEXT, TEXT, TIMESTAMP);
+CREATE OR REPLACE FUNCTION workflow.emit_change(event_entity TEXT, event_entity_id INT, event_site TEXT,
+                                                event_action TEXT, event_version TIMESTAMP,
+                                                event_row_count INT DEFAULT 1)
+RETURNS VOID AS $$
+DECLARE
+    event workflow.change_events;
+BEGIN
+    INSERT INTO workflow.change_events (entity, entity_id, site, action, version, row_count)
+    VALUES (event_entity, event_entity_id, event_site, event_action, event_version, event_row_count)
+    RETURNING * INTO event;
+    PERFORM pg_notify('guten_changes', json_build_object(
+        'id', event.id, 'entity', event.entity, 'entity_id', event.entity_id,
+        'site', event.site, 'action', event.action, 'version', event.version,
+        'row_count', event.row_count
+    )::text);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level: the changed rows come in the changed_rows transition table, and are grouped
+-- by site (sites by their own name; the other tables by site_id, see section 13). Deleted rows
+-- whose parent is gone were removed by ON DELETE CASCADE, and are left to the parent's event.
+CREATE OR REPLACE FUNCTION workflow.record_draft_changes() RETURNS TRIGGER AS $$
+DECLARE
+    parent TEXT := CASE TG_TABLE_NAME WHEN 'sections' THEN 'sites p WHERE p.id = t.site_id'
+                                      WHEN 'pages' THEN 'sections p WHERE p.id = t.section_id'
+                                      WHEN 'refs' THEN 'pages p WHERE p.id = t.page_id'
+                                      WHEN 'notes' THEN 'pages p WHERE p.id = t.page_id' END;
+    change RECORD;
+BEGIN
+    FOR change IN EXECUTE format(
+        'SELECT %s AS site, count(*)::INT AS row_count, min(t.id) AS entity_id, max(t.updated_at) AS version '
+        'FROM changed_rows t %s %s GROUP BY 1',
+        CASE WHEN TG_TABLE_NAME = 'sites' THEN 't.name' ELSE 's.name' END,
+        CASE WHEN TG_TABLE_NAME = 'sites' THEN '' ELSE 'LEFT JOIN draft.sites s ON s.id = t.site_id' END,
+        CASE WHEN TG_OP = 'DELETE' AND parent IS NOT NULL THEN 'WHERE EXISTS (SELECT 1 FROM draft.' || parent || ')' ELSE '' END
+    ) LOOP
+        PERFORM workflow.emit_change(TG_TABLE_NAME,
+                                     CASE WHEN change.row_count = 1 THEN change.entity_id END,
+                                     change.site, lower(TG_OP),
+                                     CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE change.version END,
+                                     change.row_count);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION workflow.record_publish_change() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.action IN ('publish', 'rollback') THEN
+        PERFORM workflow.emit_change('published', NEW.site_id,
+                                     (SELECT name FROM draft.sites WHERE id = NEW.site_id),
+                                     NEW.action, NEW.timestamp);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One trigger per table and operation (a trigger with a transition table takes a single event).
+-- record_change is the row-level trigger of earlier versions of this file.
+DO $$
+DECLARE
+    target_table TEXT;
+BEGIN
+    FOREACH target_table IN ARRAY ARRAY['sites', 'sections', 'pages', 'refs', 'notes'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS record_change ON draft.%I', target_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS record_insert ON draft.%I', target_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS record_update ON draft.%I', target_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS record_delete ON draft.%I', target_table);
+        EXECUTE format('CREATE TRIGGER record_insert AFTER INSERT ON draft.%I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION workflow.record_draft_changes()', target_table);
+        EXECUTE format('CREATE TRIGGER record_update AFTER UPDATE ON draft.%I REFERENCING NEW TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION workflow.record_draft_changes()', target_table);
+        EXECUTE format('CREATE TRIGGER record_delete AFTER DELETE ON draft.%I REFERENCING OLD TABLE AS changed_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION workflow.record_draft_changes()', target_table);
+    END LOOP;
+END $$;
+DROP FUNCTION IF EXISTS workflow.record_draft_change();
+
+DROP TRIGGER IF EXISTS record_change ON workflow.publishing_log;
+CREATE TRIGGER record_change AFTER INSERT ON workflow.publishing_log
+    FOR EACH ROW EXECUTE FUNCTION workflow.record_publish_change();
+
+-- 13️ Site Keys (pages, refs and notes carry their site's id: listings and publishing filter on it
+-- directly, and it is the partition key of scripts/database/partition_by_site.sql)
+
+ALTER TABLE draft.pages ADD COLUMN IF NOT EXISTS site_id INT;
+ALTER TABLE draft.refs ADD COLUMN IF NOT EXISTS site_id INT;
+ALTER TABLE draft.notes ADD COLUMN IF NOT EXISTS site_id INT;
+ALTER TABLE published.pages ADD COLUMN IF NOT EXISTS site_id INT;
+ALTER TABLE published.refs ADD COLUMN IF NOT EXISTS site_id INT;
+ALTER TABLE published.notes ADD COLUMN IF NOT EXISTS site_id INT;
+
+UPDATE draft.pages page SET site_id = sec.site_id
+FROM draft.sections sec WHERE sec.id = page.section_id AND page.site_id IS NULL;
+UPDATE draft.refs ref SET site_id = page.site_id
+FROM draft.pages page WHERE page.id = ref.page_id AND ref.site_id IS NULL;
+UPDATE draft.notes note SET site_id = page.site_id
+FROM draft.pages page WHERE page.id = note.page_id AND note.site_id IS NULL;
+UPDATE published.pages page SET site_id = sec.site_id
+FROM published.sections sec WHERE sec.id = page.section_id AND page.site_id IS NULL;
+UPDATE published.refs ref SET site_id = page.site_id
+FROM published.pages page WHERE page.id = ref.page_id AND ref.site_id IS NULL;
+UPDATE published.notes note SET site_id = page.site_id
+FROM published.pages page WHERE page.id = note.page_id AND note.site_id IS NULL;
+
+ALTER TABLE draft.pages ALTER COLUMN site_id SET NOT NULL;
+ALTER TABLE draft.refs ALTER COLUMN site_id SET NOT NULL;
+ALTER TABLE draft.notes ALTER COLUMN site_id SET NOT NULL;
+ALTER TABLE published.pages ALTER COLUMN site_id SET NOT NULL;
+ALTER TABLE published.refs ALTER COLUMN site_id SET NOT NULL;
+ALTER TABLE published.notes ALTER COLUMN site_id SET NOT NULL;
+
+-- The app sets a page's site_id from its section; refs and notes reference (site_id, id) of their
+-- page, so they follow it (ON UPDATE CASCADE) when it moves to a section of another site
+CREATE UNIQUE INDEX IF NOT EXISTS idx_draft_pages_site_id ON draft.pages (site_id, id);
+CREATE INDEX IF NOT EXISTS idx_draft_refs_site_page ON draft.refs (site_id, page_id);
+CREATE INDEX IF NOT EXISTS idx_draft_notes_site_page ON draft.notes (site_id, page_id);
+CREATE INDEX IF NOT EXISTS idx_published_pages_site ON published.pages (site_id);
+CREATE INDEX IF NOT EXISTS idx_published_refs_site ON published.refs (site_id);
+CREATE INDEX IF NOT EXISTS idx_published_notes_site ON published.notes (site_id);
+
+ALTER TABLE draft.refs DROP CONSTRAINT IF EXISTS refs_page_id_fkey;
+ALTER TABLE draft.refs DROP CONSTRAINT IF EXISTS refs_site_page_fkey;
+ALTER TABLE draft.refs ADD CONSTRAINT refs_site_page_fkey FOREIGN KEY (site_id, page_id)
+    REFERENCES draft.pages (site_id, id) ON UPDATE CASCADE ON DELETE CASCADE;
+ALTER TABLE draft.notes DROP CONSTRAINT IF EXISTS notes_page_id_fkey;
+ALTER TABLE draft.notes DROP CONSTRAINT IF EXISTS notes_site_page_fkey;
+ALTER TABLE draft.notes ADD CONSTRAINT notes_site_page_fkey FOREIGN KEY (site_id, page_id)
+    REFERENCES draft.pages (site_id, id) ON UPDATE CASCADE ON DELETE CASCADE;
@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.batch import MAX_BATCH_ITEMS, _check_ids, batch_delete, batch_update
+
+
+# Validation has to reject a batch before it locks or writes anything
+class NoDatabase:
+    def __getattr__(self, name):
+        raise AssertionError(f"the database was used ({name}) before the batch was validated")
+
+
+def _rejected(call) -> HTTPException:
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(call)
+    return exc_info.value
+
+
+def test_check_ids():
+    _check_ids(list(range(MAX_BATCH_ITEMS)))
+    with pytest.raises(HTTPException) as exc_info:
+        _check_ids(list(range(MAX_BATCH_ITEMS + 1)))
+    assert exc_info.value.status_code == 422
+    with pytest.raises(HTTPException) as exc_info:
+        _check_ids([1, 2, 1])
+    assert exc_info.value.status_code == 422
+    assert "only once" in exc_info.value.detail
+
+
+def test_batch_update_rejects_duplicate_and_too_many_ids():
+    error = _rejected(batch_update(NoDatabase(), "pages", [{"id": 1, "title": "a"}, {"id": 1, "title": "b"}]))
+    assert error.status_code == 422
+    items = [{"id": i, "title": "t"} for i in range(MAX_BATCH_ITEMS + 1)]
+    assert _rejected(batch_update(NoDatabase(), "pages", items)).status_code == 422
+    assert _rejected(batch_delete(NoDatabase(), "refs", [5, 5])).status_code == 422
+
+
+@pytest.mark.parametrize("entity, item, columns", [
+    ("pages", {"id": 1, "title": "t", "section_id": 2}, "section_id"),
+    ("pages", {"id": 1, "site_id": 2, "updated_at": None}, "site_id, updated_at"),
+    ("sections", {"id": 1, "sort_order": 3}, "sort_order"),
+    ("refs", {"id": 1, "page_id": 9}, "page_id"),
+])
+def test_batch_update_rejects_columns_it_may_not_change(entity, item, columns):
+    error = _rejected(batch_update(NoDatabase(), entity, [{"id": 2, "title" if entity != "refs" else "url": "x"}, item]))
+    assert error.status_code == 422
+    assert error.detail == f"Cannot update {columns} of {entity}"
+
+
+def test_unknown_entity():
+    assert _rejected(batch_update(NoDatabase(), "notes", [{"id": 1}])).status_code == 404
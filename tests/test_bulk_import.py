@@ -0,0 +1,117 @@
+import asyncio
+import json
+from app.bulk_import import BulkImporter, iter_lines
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+# Stands in for the session once the site's ids are known: records INSERTs and returns page ids
+class FakeSession:
+    def __init__(self):
+        self.inserted = []
+        self.next_page_id = 100
+
+    async def execute(self, statement, rows=None):
+        self.inserted.append((statement.table.name, rows))
+        returned = []
+        for row in rows or []:
+            if "name" in row:
+                returned.append((self.next_page_id, row["name"], row["section_id"]))
+                self.next_page_id += 1
+        return FakeResult(returned)
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+def _importer(db=None):
+    importer = BulkImporter(db or FakeSession(), batch_size=10)
+    importer.site_ids = {"site": 1, "gone": None}
+    importer.section_ids = {("site", "sec"): 1}
+    importer.page_ids = {("site", "sec", "intro"): 1}
+    return importer
+
+
+def _line(record: dict) -> str:
+    return json.dumps(record)
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(lines):
+    return [line async for line in lines]
+
+
+def test_iter_lines_joins_lines_split_across_chunks():
+    lines = asyncio.run(_collect(iter_lines(_chunks(b"ab", b"c\nde", b"", b"f\n\ngh", b"i"))))
+    assert lines == [b"abc", b"def", b"", b"ghi"]
+
+
+def test_iter_lines_handles_a_line_split_into_many_chunks():
+    chunks = [b"x"] * 10000 + [b"\ny"]
+    lines = asyncio.run(_collect(iter_lines(_chunks(*chunks))))
+    assert lines == [b"x" * 10000, b"y"]
+
+
+# Bad records are reported against their line number and the good ones are still imported
+def test_per_line_errors():
+    db = FakeSession()
+    page = {"type": "page", "site_name": "site", "section_name": "sec", "name": "new", "title": "New"}
+    body = "\n".join([
+        _line(page),
+        "not json",
+        _line({"type": "video"}),
+        _line({"type": "page", "site_name": "site"}),
+        _line({**page, "site_name": "gone"}),
+        _line({**page, "section_name": "nope"}),
+        _line({"type": "note", "site_name": "site", "section_name": "sec", "page_name": "missing", "note": "n"}),
+        _line({"type": "note", "site_name": "site", "section_name": "sec", "page_name": "new", "note": "n"}),
+        "",
+    ]).encode() + b"\n\xff\xfe\n" + _line({**page, "name": "été"}).encode()
+
+    async def run():
+        importer = _importer(db)
+        line_no = 0
+        async for line in iter_lines(_chunks(body[:7], body[7:])):
+            line_no += 1
+            await importer.add_line(line_no, line)
+        return await importer.finish()
+
+    summary = asyncio.run(run())
+    errors = {error["line"]: error["error"] for error in summary["errors"]}
+    assert sorted(errors) == [2, 3, 4, 5, 6, 7, 10]
+    assert errors[5] == "Site not found"
+    assert errors[6] == "Section not found"
+    assert errors[7] == "Page not found"
+    assert errors[10].startswith("Line is not valid UTF-8")
+    assert summary["inserted"] == {"page": 2, "ref": 0, "note": 1}
+    # The note was written against the id returned for the page queued before it
+    assert ("notes", [{"page_id": 100, "site_id": 1, "note": "n"}]) in db.inserted
+
+
+def test_add_line_accepts_text_lines():
+    async def lines():
+        yield _line({"type": "ref", "site_name": "site", "section_name": "sec", "page_name": "intro",
+                     "url": "https://example.com", "description": "d"})
+
+    async def run():
+        importer = _importer()
+        await importer.add_line(1, "  ")
+        async for line in lines():
+            await importer.add_line(2, line)
+        return await importer.finish()
+
+    summary = asyncio.run(run())
+    assert summary == {"inserted": {"page": 0, "ref": 1, "note": 0}, "errors": []}
@@ -0,0 +1,111 @@
+import pytest
+from app import cache
+from app.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_the_ttl(clock):
+    entries = TTLCache(max_size=10, ttl=30)
+    entries.set(("site", "page"), "v1")
+    clock[0] += 29
+    assert entries.get(("site", "page")) == "v1"
+    clock[0] += 2
+    assert entries.get(("site", "page")) is None
+    assert len(entries) == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    entries = TTLCache(max_size=2, ttl=30)
+    entries.set(("a",), 1)
+    entries.set(("b",), 2)
+    entries.get(("a",))
+    entries.set(("c",), 3)
+    assert entries.get(("b",)) is None
+    assert entries.get(("a",)) == 1
+    assert entries.get(("c",)) == 3
+
+
+def test_zero_size_cache_stores_nothing(clock):
+    entries = TTLCache(max_size=0)
+    entries.set(("a",), 1)
+    assert entries.get(("a",)) is None
+
+
+def test_invalidate_prefix_drops_only_that_prefix(clock):
+    entries = TTLCache()
+    entries.set(("site", "p1"), 1)
+    entries.set(("site", "p2"), 2)
+    entries.set(("other", "p1"), 3)
+    assert entries.invalidate_prefix("site") == 2
+    assert entries.get(("site", "p1")) is None
+    assert entries.get(("other", "p1")) == 3
+
+
+# A read that started before an invalidation must not put its (stale) result in the cache
+def test_set_skips_values_read_before_an_invalidation(clock):
+    entries = TTLCache()
+    generation = entries.generation("site")
+    entries.invalidate_site("site")
+    entries.set(("site", "p1"), "stale", generation)
+    assert entries.get(("site", "p1")) is None
+
+    generation = entries.generation("site")
+    entries.invalidate_site("other")
+    entries.set(("site", "p1"), "fresh", generation)
+    assert entries.get(("site", "p1")) == "fresh"
+
+
+# Publishes run in whichever process claimed the job: the others hear of them on the change feed
+def test_publish_event_from_the_change_feed_drops_the_sites_pages(clock):
+    from app.cache import published_page_cache
+    from app.change_feed import ChangeFeed
+
+    published_page_cache.set(("site", "p1"), "old")
+    published_page_cache.set(("other", "p1"), "kept")
+    feed = ChangeFeed("postgresql://unused", None)
+    feed.publish({"id": 1, "entity": "pages", "site": "site", "action": "update"})
+    assert published_page_cache.get(("site", "p1")) == "old"
+    feed.publish({"id": 2, "entity": "published", "site": "site", "action": "publish"})
+    assert published_page_cache.get(("site", "p1")) is None
+    assert published_page_cache.get(("other", "p1")) == "kept"
+    published_page_cache.clear()
+
+
+# A lagging replica could return the page as it was before a publish: only primary reads are cached
+def test_published_pages_read_from_a_replica_are_not_cached(clock, monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    from app import crud, database
+    from app.cache import published_page_cache
+
+    replica, primary = object(), object()
+    monkeypatch.setattr(database, "replica_engines", [replica])
+    page = SimpleNamespace(id=1, section_id=1, name="p1", title="P1", primary_image=None, abstract=None, content="c")
+
+    class FakeSession:
+        def __init__(self, bind):
+            self.bind = bind
+            self.queries = 0
+
+        async def execute(self, statement):
+            self.queries += 1
+            return SimpleNamespace(scalar_one_or_none=lambda: page)
+
+    async def read(db):
+        return await crud.get_published_page(db, "site", "p1")
+
+    db = FakeSession(replica)
+    assert asyncio.run(read(db)).content == "c"
+    assert published_page_cache.get(("site", "p1")) is None
+
+    db = FakeSession(primary)
+    asyncio.run(read(db))
+    asyncio.run(read(db))
+    assert db.queries == 1
+    published_page_cache.clear()
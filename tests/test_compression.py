@@ -0,0 +1,106 @@
+import asyncio
+import gzip
+import httpx
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from app.compression import CompressionMiddleware, choose_encoding
+
+BIG = b'{"content": "' + b"x" * 4000 + b'"}'
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+
+@app.get("/big")
+async def big():
+    return Response(BIG, media_type="application/json", headers={"ETag": '"abc"'})
+
+
+@app.get("/small")
+async def small():
+    return Response(b'{"ok": true}', media_type="application/json", headers={"ETag": '"abc"'})
+
+
+@app.get("/image")
+async def image():
+    return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+
+@app.get("/precompressed")
+async def precompressed():
+    return Response(gzip.compress(BIG), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+
+@app.get("/stream")
+async def stream():
+    async def lines():
+        for i in range(3):
+            yield b'{"line": %d}\n' % i
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/not-modified")
+async def not_modified():
+    return Response(status_code=304, headers={"ETag": '"abc"'})
+
+
+def get(path: str, **headers):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+    return asyncio.run(run())
+
+
+def test_choose_encoding_honours_q_values():
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("*;q=0") is None
+    assert choose_encoding("deflate") is None
+
+
+def test_large_body_is_compressed_with_its_own_etag():
+    response = get("/big", **{"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"abc-gzip"'
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == BIG  # httpx decodes it
+    assert int(response.headers["content-length"]) < len(BIG)
+
+
+def test_body_below_the_minimum_size_is_sent_as_is_but_varies():
+    response = get("/small", **{"accept-encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"abc"'
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_identity_response_of_a_compressible_type_varies():
+    response = get("/big", **{"accept-encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"abc"'
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_other_types_and_encoded_bodies_pass_through():
+    response = get("/image", **{"accept-encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+    response = get("/precompressed", **{"accept-encoding": "gzip"})
+    assert response.content == BIG
+    assert "vary" not in response.headers
+
+
+def test_streamed_response_is_compressed_chunk_by_chunk():
+    response = get("/stream", **{"accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.splitlines() == ['{"line": 0}', '{"line": 1}', '{"line": 2}']
+
+
+def test_not_modified_answers_with_the_tag_the_client_holds():
+    response = get("/not-modified", **{"accept-encoding": "gzip", "if-none-match": '"abc-gzip"'})
+    assert response.status_code == 304
+    assert response.headers["etag"] == '"abc-gzip"'
+    response = get("/not-modified", **{"accept-encoding": "gzip", "if-none-match": '"abc"'})
+    assert response.headers["etag"] == '"abc"'
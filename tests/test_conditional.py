@@ -0,0 +1,98 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException, Request, Response
+from app.conditional import check_not_modified, make_validators, rows_version, set_validators, _not_modified
+from app.routes.pages import full_listing
+
+UPDATED = datetime(2025, 3, 1, 12, 30, 15, 123456)
+VERSION = (2, UPDATED, 3)
+
+
+def _request(path="/guten/pages", query="site=s&section=a", **headers):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_etag_depends_on_the_version_and_the_url():
+    etag, last_modified = make_validators(_request(), VERSION)
+    assert etag.startswith('"') and etag.endswith('"')
+    assert make_validators(_request(), VERSION)[0] == etag
+    assert make_validators(_request(), (2, UPDATED, 4))[0] != etag
+    assert make_validators(_request(), (3, UPDATED, 3))[0] != etag
+    assert make_validators(_request(query="site=s&section=b"), VERSION)[0] != etag
+    # Last-Modified is the naive (UTC) updated_at cut to whole seconds, as HTTP dates carry
+    assert last_modified == datetime(2025, 3, 1, 12, 30, 15, tzinfo=timezone.utc)
+    assert make_validators(_request(), (0, None, None))[1] is None
+
+
+def test_rows_version():
+    rows = [SimpleNamespace(id=1, updated_at=UPDATED), SimpleNamespace(id=2, updated_at=None)]
+    assert rows_version(rows) == (2, UPDATED, 3)
+    assert rows_version([]) == (0, None, None)
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    ("{etag}", True),
+    ("W/{etag}", True),
+    ('"other", {etag}', True),
+    ("*", True),
+    ("{gzip}", True),
+    ("W/{br}", True),
+    ('"other"', False),
+    ('"other-gzip"', False),
+    ("", False),
+])
+def test_if_none_match(if_none_match, expected):
+    etag, last_modified = make_validators(_request(), VERSION)
+    header = if_none_match.format(etag=etag, gzip=etag[:-1] + '-gzip"', br=etag[:-1] + '-br"')
+    assert _not_modified(_request(if_none_match=header), etag, last_modified) is expected
+
+
+def test_if_modified_since():
+    etag, last_modified = make_validators(_request(), VERSION)
+    assert _not_modified(_request(if_modified_since="Sat, 01 Mar 2025 12:30:15 GMT"), etag, last_modified)
+    assert not _not_modified(_request(if_modified_since="Sat, 01 Mar 2025 12:30:14 GMT"), etag, last_modified)
+    assert not _not_modified(_request(if_modified_since="yesterday"), etag, last_modified)
+    # If-None-Match takes precedence over If-Modified-Since
+    request = _request(if_none_match='"other"', if_modified_since="Sat, 01 Mar 2025 12:30:15 GMT")
+    assert not _not_modified(request, etag, last_modified)
+
+
+def test_check_not_modified():
+    etag, _ = make_validators(_request(), VERSION)
+    response = Response()
+    check_not_modified(_request(), response, VERSION, single_row=True)
+    assert response.headers["etag"] == etag
+    assert response.headers["last-modified"] == "Sat, 01 Mar 2025 12:30:15 GMT"
+
+    with pytest.raises(HTTPException) as exc_info:
+        check_not_modified(_request(if_none_match=etag), Response(), VERSION)
+    assert exc_info.value.status_code == 304
+    assert exc_info.value.headers == {"ETag": etag}
+
+    # No rows: no validators, so the route can still answer 404
+    response = Response()
+    check_not_modified(_request(if_none_match="*"), response, (0, None, None))
+    assert "etag" not in response.headers
+
+
+def test_set_validators_on_collections():
+    response = Response()
+    set_validators(_request(), response, [SimpleNamespace(id=1, updated_at=UPDATED)])
+    assert "etag" in response.headers and "last-modified" not in response.headers
+    response = Response()
+    set_validators(_request(), response, [])
+    assert "etag" not in response.headers
+
+
+def test_only_full_page_listings_get_validators():
+    assert full_listing(None, None, False)
+    assert not full_listing(10, None, False)
+    assert not full_listing(None, 50, False)
+    assert not full_listing(None, None, True)
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import os
+import shutil
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from benchmarks.postgres import TemporaryPostgres, create_database
+from app import crud
+
+# Publishing runs PostgreSQL-specific SQL, so these tests need a server: TEST_DATABASE_URL names a
+# DEDICATED database (dropped and recreated), otherwise a throwaway one is started with initdb/pg_ctl
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture(scope="module")
+def database_url():
+    if TEST_DATABASE_URL:
+        yield TEST_DATABASE_URL
+        return
+    if not (os.getenv("PG_BIN") or shutil.which("initdb")):
+        pytest.skip("needs TEST_DATABASE_URL or the Postgres binaries (initdb, pg_ctl)")
+    with TemporaryPostgres() as pg:
+        yield pg.url
+
+
+async def _session(url: str):
+    await create_database(url)
+    engine = create_async_engine(url)
+    return engine, sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _seed_site(db: AsyncSession):
+    await db.execute(text("INSERT INTO draft.sites (id, name, title) VALUES (1, 'site', 'Site')"))
+    await db.execute(text("INSERT INTO draft.sections (id, site_id, name, title) VALUES (1, 1, 'sec', 'Sec')"))
+    await db.execute(text("""
+        INSERT INTO draft.pages (id, section_id, site_id, name, title, content)
+        VALUES (1, 1, 1, 'intro', 'Intro', 'first'), (2, 1, 1, 'other', 'Other', 'other')
+    """))
+    await db.execute(text("INSERT INTO draft.notes (page_id, site_id, note) VALUES (1, 1, 'a note')"))
+    await db.commit()
+
+
+async def _published_pages(db: AsyncSession):
+    result = await db.execute(text("SELECT id, name, content FROM published.pages ORDER BY id"))
+    return [tuple(row) for row in result.all()]
+
+
+# A page deleted in draft and recreated under the same name (new id) must replace the published
+# one: the stale row has to go before the new one is copied, or the unique name clashes
+@pytest.mark.parametrize("incremental", [False, True])
+def test_publish_after_recreating_a_page_with_the_same_name(database_url, incremental):
+    async def run():
+        engine, Session = await _session(database_url)
+        try:
+            async with Session() as db:
+                await _seed_site(db)
+                await crud.publish_site(db, "site")
+                assert await _published_pages(db) == [(1, "intro", "first"), (2, "other", "other")]
+
+                await db.execute(text("DELETE FROM draft.pages WHERE id = 1"))
+                await db.execute(text("""
+                    INSERT INTO draft.pages (id, section_id, site_id, name, title, content)
+                    VALUES (3, 1, 1, 'intro', 'Intro', 'second')
+                """))
+                await db.commit()
+
+                stats = await crud.publish_site(db, "site", incremental=incremental)
+                assert stats["pages"]["deleted"] == 1
+                assert await _published_pages(db) == [(2, "other", "other"), (3, "intro", "second")]
+                notes = await db.execute(text("SELECT count(*) FROM published.notes"))
+                assert notes.scalar() == 0
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+# The snapshot is written after the publish commits: its failure is recorded on the job, which
+# still completes, and the site stays published
+def test_snapshot_failure_keeps_the_publish_job_completed(database_url, monkeypatch):
+    from app.models import PublishingRequest
+    from app.publish_queue import PublishQueue
+
+    async def failing_export(db, site_name):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(crud, "export_snapshot", failing_export)
+
+    async def run():
+        engine, Session = await _session(database_url)
+        try:
+            async with Session() as db:
+                await _seed_site(db)
+                job = PublishingRequest(site_id=1, status="pending", snapshot=True)
+                db.add(job)
+                await db.commit()
+
+            await PublishQueue(Session)._run(job.id)
+
+            async with Session() as db:
+                job = await db.get(PublishingRequest, job.id)
+                assert job.status == "completed"
+                assert json.loads(job.progress)["snapshot_error"] == "No space left on device"
+                assert len(await _published_pages(db)) == 2
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+# A job left 'running' by a process that died is run again on start (a recent one is left to its
+# worker), and the per-site lock is dropped once no job needs it
+def test_start_requeues_stale_running_jobs(database_url):
+    from datetime import datetime, timedelta
+    from app.models import PublishingRequest
+    from app.publish_queue import PUBLISH_STALE_SECONDS, PublishQueue
+
+    async def run():
+        engine, Session = await _session(database_url)
+        try:
+            async with Session() as db:
+                await _seed_site(db)
+                started = datetime.utcnow() - timedelta(seconds=PUBLISH_STALE_SECONDS + 60)
+                stale = PublishingRequest(site_id=1, status="running", started_at=started)
+                recent = PublishingRequest(site_id=1, status="running", started_at=datetime.utcnow())
+                db.add_all([stale, recent])
+                await db.commit()
+
+            queue = PublishQueue(Session, workers=1)
+            await queue.start()
+            await queue.queue.join()
+            await queue.stop()
+            assert queue.site_locks == {}
+
+            async with Session() as db:
+                assert (await db.get(PublishingRequest, stale.id)).status == "completed"
+                assert (await db.get(PublishingRequest, recent.id)).status == "running"
+                assert len(await _published_pages(db)) == 2
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
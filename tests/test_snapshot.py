@@ -0,0 +1,74 @@
+import asyncio
+import os
+import pytest
+from app import snapshot
+from app.snapshot import resolve_file, site_dir, snapshot_lock, write_snapshot
+
+NAV = {"site": {"id": 1, "name": "site", "title": "Site"}, "sections": [{"id": 1, "name": "sec", "title": "Sec", "pages": []}]}
+PAGES = [{"id": 1, "section_id": 1, "name": "intro", "title": "Intro", "content": "x" * 2000}]
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _page_file():
+    return write_snapshot("site", {**NAV, "sections": [dict(s) for s in NAV["sections"]]}, PAGES)["pages"]["intro"]
+
+
+def test_resolve_file_prefers_a_compressed_variant_the_client_accepts():
+    filename = _page_file()
+    path, encoding = resolve_file("site", filename, "gzip, deflate")
+    assert encoding == "gzip" and path.endswith(".gz")
+    path, encoding = resolve_file("site", filename, "")
+    assert encoding is None and path.endswith(".json")
+
+
+def test_resolve_file_honours_q_zero():
+    filename = _page_file()
+    assert resolve_file("site", filename, "gzip;q=0, br;q=0")[1] is None
+    assert resolve_file("site", filename, "*;q=0")[1] is None
+    assert resolve_file("site", filename, "*")[1] is not None
+
+
+def test_unsafe_names_are_rejected():
+    _page_file()
+    assert resolve_file("site", "../site/manifest.json", "") == (None, None)
+    assert resolve_file("site", ".snapshot.lock", "") == (None, None)
+    assert resolve_file("site", "missing.json", "") == (None, None)
+    with pytest.raises(ValueError):
+        site_dir("../etc")
+
+
+def test_a_new_snapshot_removes_unreferenced_files_but_keeps_the_lock():
+    old = _page_file()
+
+    async def locked_write():
+        async with snapshot_lock("site"):
+            return write_snapshot("site", {**NAV, "sections": [dict(NAV["sections"][0])]},
+                                  [{**PAGES[0], "content": "changed"}])
+
+    new = asyncio.run(locked_write())["pages"]["intro"]
+    files = set(os.listdir(site_dir("site")))
+    assert new in files and old not in files
+    assert ".snapshot.lock" in files
+
+
+# Two snapshots of a site must not run at once: each removes the files the other's manifest needs
+@pytest.mark.skipif(snapshot.fcntl is None, reason="needs fcntl")
+def test_snapshot_lock_serializes_writers():
+    events = []
+
+    async def writer(name):
+        async with snapshot_lock("site"):
+            events.append(f"{name} in")
+            await asyncio.sleep(0.05)
+            events.append(f"{name} out")
+
+    async def run():
+        await asyncio.gather(writer("a"), writer("b"))
+
+    asyncio.run(run())
+    assert events in (["a in", "a out", "b in", "b out"], ["b in", "b out", "a in", "a out"])
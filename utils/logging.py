@@ -1,36 +1,143 @@
+from contextvars import ContextVar
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+import queue
+import random
 
-def setup_logging(log_level: str = "INFO", log_file: str = "app.log", max_file_size: int = 10_000_000, backup_count: int = 5):
+# Logging profile and overrides (set through the environment / .env):
+#   LOG_PROFILE   development (default) or production
+#   LOG_LEVEL     overrides the profile's level (DEBUG in development, INFO in production)
+#   LOG_QUEUED    overrides whether handlers run on a background thread (on in production)
+#   LOG_SAMPLING  per-logger sample rates for records below WARNING, e.g. "app.crud=0.1,app.routes=0.05"
+# These are read when setup_logging is called, after .env has been loaded.
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] [%(request_id)s] %(name)s: %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Id of the HTTP request being handled in the current task (set by app.tracing.RequestIdMiddleware)
+request_id_var = ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Stamps every record with the current request id, so lines from crud and the routes
+    can be correlated. Runs on the emitting thread, where the contextvar is visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+def parse_sampling(spec: str) -> dict:
+    """
+    Parses a sampling spec such as "app.crud=0.1,app.routes=0.05" into {logger_name: rate}.
+    """
+    rates = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, rate = item.split("=", 1)
+        rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a random fraction of the records below WARNING from the configured loggers
+    (and their children). Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        # Longest names first so the most specific logger prefix wins
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for name, rate in self.rates:
+            if record.name == name or record.name.startswith(name + "."):
+                return random.random() < rate
+        return True
+
+
+def setup_logging(log_level: str = None, log_file: str = "app.log", max_file_size: int = 10_000_000, backup_count: int = 5,
+                  queued: bool = None, sampling: dict = None, slow_query_file: str = None):
     """
     Configures logging for the application.
 
     Args:
-        log_level (str): The log level (DEBUG, INFO, WARNING, ERROR, CRITICAL).
+        log_level (str): The log level (DEBUG, INFO, WARNING, ERROR, CRITICAL). LOG_LEVEL in the environment wins;
+            otherwise defaults to DEBUG in development and INFO in production.
         log_file (str): Path to the log file.
         max_file_size (int): Maximum size of the log file in bytes before rotation.
         backup_count (int): Number of rotated log files to keep.
+        queued (bool): Hand records to a QueueHandler and write them from a QueueListener thread, so the
+            event loop never blocks on console or disk I/O. Defaults to LOG_QUEUED, or on in production.
+        sampling (dict): Per-logger sample rates for records below WARNING. Defaults to LOG_SAMPLING.
+        slow_query_file (str): If set, records of the app.slow_query logger (JSON lines) are also written to this file.
+
+    Returns:
+        The QueueListener when queued (stopped automatically at exit), otherwise None.
     """
-    # Ensure the log directory exists
-    log_dir = os.path.dirname(log_file)
-    if log_dir and not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+    production = os.getenv("LOG_PROFILE", "development").strip().lower() == "production"
+    log_level = os.getenv("LOG_LEVEL") or log_level or ("INFO" if production else "DEBUG")
+    if queued is None:
+        queued = os.getenv("LOG_QUEUED", "true" if production else "false").strip().lower() in ("1", "true", "yes", "on")
+    if sampling is None:
+        sampling = parse_sampling(os.getenv("LOG_SAMPLING", ""))
+
+    # Ensure the log directories exist
+    for path in (log_file, slow_query_file):
+        log_dir = os.path.dirname(path or "")
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+    handlers = [
+        logging.StreamHandler(),  # Console logging
+        RotatingFileHandler(log_file, maxBytes=max_file_size, backupCount=backup_count),  # File logging
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    if slow_query_file:
+        slow_query_handler = RotatingFileHandler(slow_query_file, maxBytes=max_file_size, backupCount=backup_count)
+        slow_query_handler.setFormatter(logging.Formatter("%(message)s"))
+        slow_query_handler.addFilter(logging.Filter("app.slow_query"))
+        handlers.append(slow_query_handler)
+
+    listener = None
+    if queued:
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.setFormatter(logging.Formatter("%(message)s"))  # merge args only; layout happens on the listener
+        root_handlers = [queue_handler]
+    else:
+        root_handlers = handlers
+
+    # Sampling and request ids run on the calling thread, before a record is formatted or queued
+    for handler in root_handlers:
+        if sampling:
+            handler.addFilter(SamplingFilter(sampling))
+        handler.addFilter(RequestIdFilter())
 
     # Set up the root logger
     logging.basicConfig(
         level=getattr(logging, log_level.upper(), logging.INFO),
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=[
-            logging.StreamHandler(),  # Console logging
-            RotatingFileHandler(log_file, maxBytes=max_file_size, backupCount=backup_count),  # File logging
-        ],
+        handlers=root_handlers,
+        force=True,
     )
+    return listener
 
 # Example usage for debugging
 if __name__ == "__main__":
-    setup_logging()
+    setup_logging(queued=True)
     logger = logging.getLogger(__name__)
     logger.info("Logging setup is complete.")
     logger.debug("This is a debug message.")